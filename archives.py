@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Lets the dataRoot be a .zip or .tar.gz archive of a season, such as
+# data/2017.zip, so that old seasons don't need to be extracted to be run
+# again. A file inside an archive is named by its path in the archive
+# after the archive's path, like data/2017.zip/12-06/archi.TXT, and is
+# read straight out of the archive. If everything in the archive is under
+# one directory, such as 2017/ from zipping up data/2017, that directory
+# is left out of the names. Hidden files, such as the ._ files and the
+# __MACOSX directory that the Mac Finder adds to zips, are left out like
+# glob leaves them out of a directory. The functions here take either
+# kind of name.
+
+import collections
+import fnmatch
+import io
+import os.path
+import posixpath
+
+SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+# the parts of os.stat_result that the scan cache and the database use
+FileStat = collections.namedtuple('FileStat', ['st_size', 'st_mtime_ns'])
+
+# An open archive with map(name, member) of its files. Tar members are read
+# by seeking in the decompressed stream, which is cheapest when they are
+# read in the order they are in the archive, as findFiles lists them.
+class Archive:
+  def __init__(self, filename):
+    self.filename = filename
+    if filename.lower().endswith('.zip'):
+      import zipfile
+      self.zip = zipfile.ZipFile(filename)
+      self.tar = None
+      members = [(info.filename, info) for info in self.zip.infolist()
+                 if not info.is_dir()]
+    else:
+      import tarfile
+      self.zip = None
+      self.tar = tarfile.open(filename)
+      members = [(info.name, info) for info in self.tar.getmembers()
+                 if info.isfile()]
+    members = [(posixpath.normpath(name).lstrip('/'), info)
+               for (name, info) in members]
+    members = [(name, info) for (name, info) in members
+               if not posixpath.basename(name).startswith('.') and
+                  name.split('/', 1)[0] != '__MACOSX']
+    # leave out the directory that everything is in
+    tops = set([name.split('/', 1)[0] for (name, _) in members])
+    if len(tops) == 1 and all(['/' in name for (name, _) in members]):
+      members = [(name.split('/', 1)[1], info) for (name, info) in members]
+    self.members = collections.OrderedDict(members)
+
+  def open(self, name):
+    if self.zip is not None:
+      return self.zip.open(self.members[name])
+    # Reading a member moves the decompressor to it and going back to an
+    # earlier one starts it over from the top, so each member is read
+    # whole, in case several are being read at once.
+    member = self.tar.extractfile(self.members[name])
+    with member:
+      return io.BytesIO(member.read())
+
+  def stat(self, name):
+    info = self.members[name]
+    if self.zip is not None:
+      import datetime
+      mtime = datetime.datetime(*info.date_time).timestamp()
+      return FileStat(info.file_size, int(mtime) * 1000000000)
+    return FileStat(info.size, int(info.mtime) * 1000000000)
+
+# map(filename, (pid, size, mtime, Archive)) of the archives opened by
+# this process, so that each one is only opened once unless it changes.
+# The pool workers that are forked from a process get a copy of it, but
+# they open the archives again since they can't share the file offsets.
+_archives = {}
+
+def isArchive(filename):
+  return filename.lower().endswith(SUFFIXES) and os.path.isfile(filename)
+
+# Split a name in to the Archive that it is in and its name there, or
+# (None, filename) if it isn't in an archive.
+def splitPath(filename):
+  member = []
+  path = os.path.normpath(filename)
+  while path and not isArchive(path):
+    (path, base) = os.path.split(path)
+    if not base:
+      return (None, filename)
+    member.append(base)
+  if not path:
+    return (None, filename)
+  stat = os.stat(path)
+  key = (os.getpid(), stat.st_size, stat.st_mtime_ns)
+  cached = _archives.get(path)
+  if cached is None or cached[:3] != key:
+    cached = _archives[path] = key + (Archive(path),)
+  return (cached[3], '/'.join(reversed(member)))
+
+# the files under the directory, or the archive or the directory in an
+# archive, whose names match the pattern
+def findFiles(root, pattern):
+  import glob
+  (archive, directory) = splitPath(root)
+  if archive is None:
+    return [y for x in os.walk(root)
+              for y in glob.glob(os.path.join(x[0], pattern))]
+  prefix = directory + '/' if directory else ''
+  return [os.path.join(root, name[len(prefix):]) for name in archive.members
+          if name.startswith(prefix) and
+             fnmatch.fnmatchcase(os.path.basename(name), pattern)]
+
+def isFile(filename):
+  if os.path.isfile(filename):
+    return True
+  (archive, name) = splitPath(filename)
+  return archive is not None and name in archive.members
+
+# Open a file for reading like open does, in 'r' or 'rb' mode.
+def openFile(filename, mode='r'):
+  try:
+    return open(filename, mode)
+  except (FileNotFoundError, NotADirectoryError):
+    (archive, name) = splitPath(filename)
+    if archive is None or name not in archive.members:
+      raise
+  member = archive.open(name)
+  if 'b' in mode:
+    return member
+  return io.TextIOWrapper(member)
+
+def stat(filename):
+  try:
+    return os.stat(filename)
+  except (FileNotFoundError, NotADirectoryError):
+    (archive, name) = splitPath(filename)
+    if archive is None or name not in archive.members:
+      raise
+  return archive.stat(name)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Times the phases of building the timecards on made up data from
+# genData.py at several sizes and saves the results as JSON, so that
+# runs from different versions can be compared:
+#
+#   ./benchmark.py --students 50,200,800 --output bench.json
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os.path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import yaml
+
+import genData
+import report
+import scanners
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# the best time in seconds over the runs of the function, which gets a
+# fresh value from setup each time
+def bestTime(repeat, function, setup=lambda: None):
+  best = None
+  for i in range(repeat):
+    value = setup()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+      function(value)
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+def emptyTimecards(config):
+  return scanners.Timecards(config, [], {})
+
+def loadedTimecards(config):
+  timecards = emptyTimecards(config)
+  with contextlib.redirect_stdout(io.StringIO()):
+    timecards.readScanners(config['dataRoot'])
+    timecards.readOverrides(os.path.join(config['dataRoot'], "manual.yaml"))
+  return timecards
+
+def fixedTimecards(config):
+  timecards = loadedTimecards(config)
+  timecards.fixup()
+  return timecards
+
+def buildTimesheets(timecards, outfile):
+  output = report.Report(timecards, outfile)
+  names = timecards.names()
+  for track in timecards.tracks.values():
+    output.buildTimesheet(names, report.TrackRows(track, names))
+  output.workbook.close()
+
+def benchmark(directory, students, days, repeat):
+  data_root = os.path.join(directory, 'data')
+  config = genData.generate(data_root, students=students, days=days)
+  config['scanCache'] = False
+  config['output'] = os.path.join(directory, 'timecard.xlsx')
+  with open(os.path.join(directory, 'config.yaml'), 'w') as output:
+    yaml.safe_dump(config, output, default_flow_style=False)
+  rows = sum([len(batch.scans)
+              for batch in scanners.readScannerFiles(
+                             scanners.findScannerFiles(data_root))])
+  manual = os.path.join(data_root, "manual.yaml")
+  phases = {
+    'readScanners': bestTime(repeat,
+                             lambda t: t.readScanners(data_root),
+                             lambda: emptyTimecards(config)),
+    'readOverrides': bestTime(repeat,
+                              lambda t: t.readOverrides(manual),
+                              lambda: emptyTimecards(config)),
+    'fixup': bestTime(repeat, lambda t: t.fixup(),
+                      lambda: loadedTimecards(config)),
+    'buildTimesheet': bestTime(repeat,
+                               lambda t: buildTimesheets(t, config['output']),
+                               lambda: fixedTimecards(config)),
+    'runTimes': bestTime(repeat, lambda t: subprocess.run(
+                           [sys.executable, os.path.join(HERE, 'runTimes.py')],
+                           cwd=directory, check=True,
+                           stdout=subprocess.DEVNULL)),
+  }
+  return {'students': students, 'days': days, 'rows': rows,
+          'seconds': phases}
+
+def gitVersion():
+  try:
+    return subprocess.run(['git', 'describe', '--always', '--dirty'],
+                          cwd=HERE, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL,
+                          universal_newlines=True).stdout.strip() or None
+  except OSError:
+    return None
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Benchmark the timecards on made up data.')
+  parser.add_argument('--students', default='50,200,800',
+                      help='comma separated team sizes to run')
+  parser.add_argument('--days', type=int, default=240,
+                      help='the length of the season')
+  parser.add_argument('--repeat', type=int, default=3,
+                      help='take the best of this many runs')
+  parser.add_argument('--output', default='benchmark.json',
+                      help='the JSON file for the results')
+  args = parser.parse_args()
+
+  results = []
+  for students in [int(s) for s in args.students.split(',')]:
+    with tempfile.TemporaryDirectory() as directory:
+      result = benchmark(directory, students, args.days, args.repeat)
+    print ("%5d students %8d rows: %s" %
+           (students, result['rows'],
+            ', '.join(["%s %.3fs" % (phase, seconds) for (phase, seconds)
+                       in result['seconds'].items()])))
+    results.append(result)
+  with open(args.output, 'w') as output:
+    json.dump({'version': gitVersion(),
+               'python': platform.python_version(),
+               'date': datetime.datetime.now().isoformat(),
+               'repeat': args.repeat,
+               'results': results}, output, indent=2)
+
+if __name__ == '__main__':
+  main()
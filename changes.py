@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Works out what changed since the last run, so that the mentors only
+# need to look at the students whose hours changed after a new dump. A
+# snapshot has each person's hours and state for each day and in total
+# for each track, along with the warnings. runTimes.py saves one after
+# every run and compares the next run's to it. The differences go in
+# the Changes sheet and, if asked for, a JSON file.
+
+import datetime
+import json
+import os.path
+
+# bump this when the layout of the snapshot changes
+SNAPSHOT_VERSION = 1
+
+# Hours are rounded to this many places, so that adding up the same days
+# in another order doesn't show up as a change.
+PLACES = 4
+
+# the snapshot file from the config, which defaults to
+# <dataRoot>.snapshot
+def snapshotFile(config):
+  return config.get('snapshot',
+                    os.path.normpath(config['dataRoot']) + '.snapshot')
+
+# Take a snapshot of the Timecards as a map that can be saved as JSON:
+#   time: when the snapshot was taken
+#   tracks: map(track, map(name, [total, state, map(day, [hours, state])]))
+#   warnings: list([level, name, day, track, message])
+# The hours of a day include its training, so they add up to the total.
+def takeSnapshot(timecards):
+  tracks = {}
+  for track in timecards.tracks.values():
+    people = tracks[track.name] = {}
+    for (name, person) in track.people.items():
+      people[name] = [round(track.personTotal(name), PLACES),
+                      track.personState(name),
+                      { day.isoformat(): [round(report.hours() +
+                                                report.trainingHours(),
+                                                PLACES),
+                                          report.state]
+                        for (day, report) in person.times.items() }]
+  return {'version': SNAPSHOT_VERSION,
+          'time': datetime.datetime.now().isoformat(' ', 'seconds'),
+          'tracks': tracks,
+          'warnings': [[level, name, day.isoformat(), track, msg]
+                       for (level, name, day, track, msg)
+                       in timecards.warnings]}
+
+# Read a snapshot, returning None if there isn't one or it can't be used.
+def readSnapshot(filename):
+  if not os.path.isfile(filename):
+    return None
+  try:
+    with open(filename, 'r') as inputfile:
+      snapshot = json.load(inputfile)
+  except ValueError as err:
+    print("Warning: Ignoring unreadable snapshot", filename, err)
+    return None
+  if snapshot.get('version') != SNAPSHOT_VERSION:
+    return None
+  return snapshot
+
+def writeSnapshot(filename, snapshot):
+  tmp = filename + '.tmp'
+  try:
+    with open(tmp, 'w') as output:
+      json.dump(snapshot, output, separators=(',', ':'))
+    os.replace(tmp, filename)
+  except OSError as err:
+    print("Warning: Can't write snapshot", filename, err)
+
+# The differences between two snapshots. A person that is only in one of
+# them has 0 hours and a state of None in the other. Only the people
+# whose entry in a track differs have their days compared.
+class Changes:
+  def __init__(self, old, new):
+    # when the old snapshot was taken
+    self.since = old['time']
+    # list((name, track, hours before, hours now, state before, state now))
+    # for each total that changed, sorted by name
+    self.totals = []
+    # list((name, track, day, hours before, hours now, state before,
+    #       state now)) for each day that changed, sorted by name and day
+    self.days = []
+    noTrack = {}
+    for (trackName, people) in new['tracks'].items():
+      oldPeople = old['tracks'].get(trackName, noTrack)
+      for name in set(people) | set(oldPeople):
+        (before, after) = (oldPeople.get(name), people.get(name))
+        if before != after:
+          self.comparePerson(name, trackName, before, after)
+    for (trackName, oldPeople) in old['tracks'].items():
+      if trackName not in new['tracks']:
+        for (name, before) in oldPeople.items():
+          self.comparePerson(name, trackName, before, None)
+    self.totals.sort(key=lambda change: change[:2])
+    self.days.sort(key=lambda change: change[:3])
+    # the warnings that weren't there before, in the same form as
+    # Timecards.warnings
+    oldWarnings = set([tuple(warn) for warn in old['warnings']])
+    self.warnings = [(level, name, datetime.date.fromisoformat(day), track,
+                      msg)
+                     for (level, name, day, track, msg) in new['warnings']
+                     if (level, name, day, track, msg) not in oldWarnings]
+
+  def comparePerson(self, name, trackName, before, after):
+    (oldTotal, oldState, oldDays) = before or (0.0, None, {})
+    (total, state, days) = after or (0.0, None, {})
+    if oldTotal != total or oldState != state:
+      self.totals.append((name, trackName, oldTotal, total, oldState, state))
+    for day in set(days) | set(oldDays):
+      (oldHours, oldDayState) = oldDays.get(day, (0.0, None))
+      (hours, dayState) = days.get(day, (0.0, None))
+      if oldHours != hours or oldDayState != dayState:
+        self.days.append((name, trackName, datetime.date.fromisoformat(day),
+                          oldHours, hours, oldDayState, dayState))
+
+  # the totals whose state changed, such as crossing the goal
+  def crossed(self):
+    return [change for change in self.totals if change[4] != change[5]]
+
+  def printSummary(self):
+    print ("Changes since", self.since + ":", len(self.totals), "totals,",
+           len(self.crossed()), "states,", len(self.days), "days and",
+           len(self.warnings), "new warnings")
+
+  def writeJSON(self, filename):
+    result = {'since': self.since,
+              'totals': [{'name': name, 'track': track, 'before': before,
+                          'after': after, 'change': after - before,
+                          'stateBefore': oldState, 'state': state}
+                         for (name, track, before, after, oldState, state)
+                         in self.totals],
+              'days': [{'name': name, 'track': track,
+                        'date': day.isoformat(), 'before': before,
+                        'after': after, 'change': after - before,
+                        'stateBefore': oldState, 'state': state}
+                       for (name, track, day, before, after, oldState, state)
+                       in self.days],
+              'warnings': [{'level': level, 'name': name,
+                            'date': day.isoformat(), 'track': track,
+                            'message': msg}
+                           for (level, name, day, track, msg)
+                           in self.warnings]}
+    with open(filename, 'w') as output:
+      json.dump(result, output, indent=1, sort_keys=True)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Checks that a season reads the same out of a zip and a tar.gz, with
+# several processes, as it does from its directory. By default it checks
+# made up data from genData.py, or it can be given a data root:
+#
+#   ./checkArchives.py
+#   ./checkArchives.py --jobs 8 data/2017
+
+import argparse
+import contextlib
+import io
+import os.path
+import shutil
+import sys
+import tempfile
+
+import genData
+import scanners
+
+# map(path under the root, (scans, bad rows, duplicate rows)) of the
+# files under a data root
+def rootScans(data_root, jobs):
+  with contextlib.redirect_stdout(io.StringIO()):
+    batches = scanners.readDataRoot(data_root, jobs)
+  return { os.path.relpath(batch.filename, data_root):
+             (batch.scans, batch.errors, batch.duplicates)
+           for batch in batches }
+
+# the names of the archives of the data root whose scans don't match the
+# directory's
+def checkArchives(directory, data_root, jobs):
+  expected = rootScans(data_root, 1)
+  failed = []
+  for format in ['zip', 'gztar']:
+    archive = shutil.make_archive(os.path.join(directory, 'archive'), format,
+                                  data_root)
+    if rootScans(archive, jobs) != expected:
+      failed.append(os.path.basename(archive))
+  return failed
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Check that archived seasons read like their directories.')
+  parser.add_argument('dataRoot', nargs='?',
+                      help='the season to check (made up data if not given)')
+  parser.add_argument('--jobs', type=int, default=4,
+                      help='the number of processes to read the archives with')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    data_root = args.dataRoot
+    if data_root is None:
+      data_root = os.path.join(directory, 'data')
+      genData.generate(data_root, students=50, days=60)
+    failed = checkArchives(directory, data_root, args.jobs)
+  for archive in failed:
+    print ("%s with %d jobs doesn't match %s" % (archive, args.jobs,
+                                                 args.dataRoot or 'the data'))
+  if failed:
+    sys.exit(1)
+  print ("The archives match")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Checks that the columnar backend fixes up the scans exactly like the
+# objects backend: the same scans, states, training and hours for every
+# day, the same totals and weeks for every track and the same warnings.
+# By default it checks made up data from genData.py with some unusual
+# days added, or it can be given a config:
+#
+#   ./checkColumnar.py
+#   ./checkColumnar.py config.yaml
+
+import argparse
+import contextlib
+import datetime
+import io
+import os.path
+import sys
+import tempfile
+import time
+import yaml
+
+# imported here so that the time of importing numpy isn't counted
+import columnar
+import genData
+import scanners
+
+# the Timecards from the scanner files and overrides with the backend and
+# the seconds that it took to sort the scans in to the tracks and fix them
+# up
+def buildTimecards(config, backend, batches, overrides):
+  config = dict(config, backend=backend)
+  with contextlib.redirect_stdout(io.StringIO()):
+    start = time.perf_counter()
+    timecards = scanners.Timecards(config, batches, overrides)
+  return (timecards, time.perf_counter() - start)
+
+# Add a scanner file with days that the made up data is unlikely to have:
+# an odd day where dropping the first or the last scan ties in whole
+# seconds but not in hours, scans out of order, near duplicates, a single
+# scan and a night past midnight.
+def writeEdgeCases(config):
+  day = scanners.parseDate(config['kickOff']) + datetime.timedelta(7)
+  start = datetime.datetime.combine(day, datetime.time(5))
+  # list((name, list(seconds after start)))
+  days = [("Odd Tie", [0, 14848, 30442, 43001, 54814]),
+          ("Out Order", [7200, 3600, 14400, 10800]),
+          ("Near Duplicate", [3600, 3630, 7200, 7300, 7390, 10800]),
+          ("Single Scan", [3600]),
+          ("Late Night", [57600, 72000, 79200, 82800])]
+  directory = os.path.join(config['dataRoot'], 'edge')
+  os.makedirs(directory)
+  serial = config['businessScanner']
+  with open(os.path.join(directory, serial + '.TXT'), 'w') as output:
+    for (name, seconds) in days:
+      for second in seconds:
+        time = start + datetime.timedelta(seconds=second)
+        output.write("%s,%s,%s,%s\n" % (name, serial,
+                                        time.strftime('%H:%M:%S'),
+                                        time.strftime('%m/%d/%Y')))
+
+# list(difference) between the Timecards of the two backends
+def compareTimecards(objects, columnar):
+  differences = []
+  if objects.warnings != columnar.warnings:
+    differences.append("warnings")
+  for (trackName, track) in objects.tracks.items():
+    other = columnar.tracks[trackName]
+    for field in ['dates', 'byWeek', 'total', 'states', 'eventTotals']:
+      if getattr(track, field) != getattr(other, field):
+        differences.append("%s %s" % (trackName, field))
+    if set(track.people) != set(other.people):
+      differences.append("%s people" % trackName)
+      continue
+    for (name, person) in track.people.items():
+      otherTimes = other.people[name].times
+      if set(person.times) != set(otherTimes):
+        differences.append("%s %s days" % (trackName, name))
+        continue
+      for (day, report) in person.times.items():
+        otherReport = otherTimes[day]
+        if ((report.scans, report.ignored, report.state, report.training,
+             report.hours(), report.trainingHours()) !=
+            (otherReport.scans, otherReport.ignored, otherReport.state,
+             otherReport.training, otherReport.hours(),
+             otherReport.trainingHours())):
+          differences.append("%s %s %s" % (trackName, name, day))
+  return differences
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Check that the columnar backend matches the objects one.')
+  parser.add_argument('config', nargs='?',
+                      help='the season to check (made up data if not given)')
+  parser.add_argument('--students', type=int, default=200,
+                      help='the team size of the made up data')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    if args.config is None:
+      config = genData.generate(os.path.join(directory, 'data'),
+                                students=args.students)
+      writeEdgeCases(config)
+    else:
+      with open(args.config, "r") as inputfile:
+        config = yaml.safe_load(inputfile)
+    with contextlib.redirect_stdout(io.StringIO()):
+      batches = scanners.readDataRoot(config['dataRoot'])
+    overrides = scanners.readOverrideFile(os.path.join(config['dataRoot'],
+                                                       "manual.yaml"))
+    (objects, objectsTime) = buildTimecards(config, 'objects', batches,
+                                            overrides)
+    (columnar, columnarTime) = buildTimecards(config, 'columnar', batches,
+                                              overrides)
+  print ("objects %.3fs, columnar %.3fs" % (objectsTime, columnarTime))
+  differences = compareTimecards(objects, columnar)
+  for difference in differences[:20]:
+    print ("Different:", difference)
+  if differences:
+    print (len(differences), "differences")
+    sys.exit(1)
+  print ("The backends match")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# This is a columnar version of Timecards.fixup that uses NumPy.
+# Every scan is put into flat arrays as int64 epoch seconds along with
+# integer codes for the track, student and day that it belongs to.
+# Removing the near duplicates, resolving the odd numbers of scans,
+# pairing check ins with check outs and the training hours are then
+# done for all of the days at once. The DayReports are still what the
+# splits, the watcher and the report work with, so the results are
+# written back in to them: the scans of the days that the fixup changed
+# and the hours of every day, so the Tracks look the same as with the
+# plain fixup. checkColumnar.py checks that they do.
+
+# Turn it on with "backend: columnar" in config.yaml or with
+# ./runTimes.py --backend columnar. You'll need to pip install numpy.
+
+import datetime
+import itertools
+import numpy
+import operator
+import scanners
+
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+def seconds(time):
+  return ((time.toordinal() - EPOCH) * 86400 + time.hour * 3600 +
+          time.minute * 60 + time.second)
+
+# the field of each of a list(datetime) in an array
+def timeField(times, field):
+  return numpy.fromiter(map(operator.attrgetter(field), times), numpy.int64,
+                        len(times))
+
+# the position of the first entry of each group in a list of groups with
+# the sizes
+def groupStarts(sizes):
+  return numpy.cumsum(sizes) - sizes
+
+class ScanColumns:
+  # The students' codes are their ids from the scanners.NameRegistry.
+  def __init__(self, tracks, registry):
+    self.tracks = list(tracks.values())
+    trackCodes = dict([(track, code) for (code, track)
+                                     in enumerate(self.tracks)])
+    # list((track, name, PersonInTrack)) in the same order that
+    # Timecards.fixup visits them
+    self.people = [(track, name, person) for track in self.tracks
+                                         for (name, person)
+                                         in track.people.items()]
+    # list(DayReport) and list(date) of each person's days in the same
+    # order. The index is the code for the day.
+    self.reports = [report for (track, name, person) in self.people
+                           for report in person.times.values()]
+    self.dates = [date for (track, name, person) in self.people
+                       for date in person.times]
+    days = [len(person.times) for (track, name, person) in self.people]
+    # these are indexed by the day report
+    self.person = numpy.repeat(numpy.arange(len(self.people)), days)
+    self.track = numpy.repeat(
+      numpy.array([trackCodes[track] for (track, name, person) in self.people],
+                  dtype=numpy.int32), days)
+    self.student = numpy.repeat(
+      numpy.array([registry.id(name) for (track, name, person) in self.people],
+                  dtype=numpy.int32), days)
+    # Most of the days are shared by many people, so each date's ordinal
+    # is only made once.
+    ordinals = dict([(date, date.toordinal()) for date in set(self.dates)])
+    self.day = numpy.fromiter(map(ordinals.__getitem__, self.dates),
+                              numpy.int32, len(self.dates))
+    scans = [report.scans for report in self.reports]
+    counts = list(map(len, scans))
+    # these are indexed by the scan, with the scans of each day report
+    # together in the order that they were added
+    self.scans = list(itertools.chain.from_iterable(scans))
+    self.report = numpy.repeat(numpy.arange(len(counts), dtype=numpy.int64),
+                               counts)
+    # The seconds since 1970 of the scans. Their dates come from the days
+    # that they are in, which adjustDate starts at 4am, so that only their
+    # hours, minutes and seconds have to be read out of the datetimes.
+    # Those are small enough that Python doesn't make a new int for each
+    # one, and numpy converting datetimes to datetime64 takes longer than
+    # the whole fixup.
+    hour = timeField(self.scans, 'hour')
+    self.times = ((self.day[self.report].astype(numpy.int64) - EPOCH +
+                   (hour < 4)) * 86400 + hour * 3600 +
+                  timeField(self.scans, 'minute') * 60 +
+                  timeField(self.scans, 'second'))
+
+  # the scans at the positions in the array
+  def scansAt(self, positions):
+    return [self.scans[i] for i in positions.tolist()]
+
+  # The columnar equivalent of DayReport.fixUp for every report, followed
+  # by the weekly totals from Timecards.fixup.
+  def fixup(self, timecards):
+    count = len(self.reports)
+    # The scans, which stay in this order, are at these positions of scans.
+    # They are sorted by one key with the report above the time, which is
+    # much faster than a lexsort since most of them are in order already.
+    (first, last) = ((self.times.min(), self.times.max())
+                     if len(self.times) > 0 else (0, 0))
+    span = last - first + 1
+    order = numpy.argsort(self.report * span + (self.times - first),
+                          kind='stable')
+    report = self.report[order]
+    times = self.times[order]
+    # the days that were added out of order and need to be sorted
+    unsorted = numpy.zeros(count, dtype=bool)
+    unsorted[self.report[:-1][(self.report[:-1] == self.report[1:]) &
+                              (self.times[1:] < self.times[:-1])]] = True
+
+    # Drop each scan that is too close to the next scan on the same day.
+    duplicate = numpy.zeros(len(times), dtype=bool)
+    duplicate[:-1] = ((report[:-1] == report[1:]) &
+                      (times[1:] - times[:-1] < scanners.MIN_SEPARATION))
+    ignoredCounts = numpy.bincount(report[duplicate], minlength=count)
+    ignoredScans = self.scansAt(order[duplicate])
+    report = report[~duplicate]
+    times = times[~duplicate]
+    order = order[~duplicate]
+
+    # For the days with an odd number of scans, drop the first or last scan
+    # depending on what gives the student more hours. The hours are added
+    # up in the same order as calculateHours, so that a tie in whole
+    # seconds that isn't a tie in hours is broken the same way.
+    counts = numpy.bincount(report, minlength=count)
+    position = numpy.arange(len(times)) - groupStarts(counts)[report]
+    gap = numpy.zeros(len(times))
+    gap[:-1] = numpy.where(report[:-1] == report[1:],
+                           (times[1:] - times[:-1]) / 3600.0, 0)
+    even = position % 2 == 0
+    keepFirst = numpy.bincount(report, weights=numpy.where(even, gap, 0),
+                               minlength=count)
+    keepLast = numpy.bincount(report, weights=numpy.where(even, 0, gap),
+                              minlength=count)
+    odd = counts % 2 == 1
+    dropFirst = odd & (counts > 1) & (keepFirst < keepLast)
+    dropped = odd[report] & numpy.where(dropFirst[report], position == 0,
+                                        position == counts[report] - 1)
+    oddScans = self.scansAt(order[odd[report]])
+    report = report[~dropped]
+    times = times[~dropped]
+    order = order[~dropped]
+
+    # Pair up the check ins and check outs.
+    checkIn = times[0::2]
+    checkOut = times[1::2]
+    pairReport = report[0::2]
+    worked = numpy.bincount(pairReport, weights=(checkOut - checkIn) / 3600.0,
+                            minlength=count)
+
+    # Write the scans back in to the DayReports that the fixup changed.
+    # The scans of the rest are already in order.
+    changed = unsorted | (ignoredCounts > 0) | odd
+    scanTimes = self.scansAt(order[changed[report]])
+    kept = counts - odd
+    scanStarts = numpy.zeros(count, dtype=numpy.int64)
+    scanStarts[changed] = groupStarts(kept[changed])
+    oddStarts = numpy.zeros(count, dtype=numpy.int64)
+    oddStarts[odd] = groupStarts(counts[odd])
+    ignoredStarts = groupStarts(ignoredCounts)
+    changedDays = numpy.flatnonzero(changed)
+    for (i, person, scanStart, oddStart, ignoredStart, scanCount, keep, isOdd,
+         ignored) in zip(changedDays.tolist(),
+                         *[column[changedDays].tolist() for column
+                           in [self.person, scanStarts, oddStarts,
+                               ignoredStarts, counts, kept, odd,
+                               ignoredCounts]]):
+      (track, name, _) = self.people[person]
+      (date, dayReport) = (self.dates[i], self.reports[i])
+      dayReport.scans = scanTimes[scanStart:scanStart + keep]
+      dayReport.invalidate()
+      if ignored > 0:
+        dayReport.ignored = ignoredScans[ignoredStart:ignoredStart + ignored]
+        timecards.warnings.append(('info', name, date, track.name,
+                                   ("%d near duplicate events ignored" %
+                                    ignored)))
+      if isOdd:
+        if scanCount == 1:
+          dayReport.state = "error"
+        msg = ("Odd number of events: " +
+               ', '.join(map(lambda d: d.strftime('%H:%M'),
+                             oddScans[oddStart:oddStart + scanCount])))
+        timecards.warnings.append(('ERR' if dayReport.state == "error"
+                                   else 'WARN', name, date, track.name, msg))
+
+    # The training events that each pair overlaps.
+    trained = numpy.zeros(count, dtype=bool)
+    for (trackCode, track) in enumerate(self.tracks):
+      inTrack = self.track[pairReport] == trackCode
+      for event in track.training:
+        (start, stop) = (seconds(event.start), seconds(event.stop))
+        overlap = inTrack & (checkIn < stop) & (checkOut > start)
+        hours = numpy.bincount(pairReport[overlap],
+                               weights=(numpy.minimum(checkOut[overlap], stop) -
+                                        numpy.maximum(checkIn[overlap], start))
+                                       / 3600, minlength=count)
+        for i in numpy.flatnonzero(hours > 0).tolist():
+          self.reports[i].addTraining(event.name, hours[i].item())
+        trained |= hours > 0
+
+    # Fill in the hours of the days, so the totals don't have to go over
+    # the scans again. A day's training is added up from its training
+    # hours like DayReport.trainingHours and subtracted from the hours
+    # worked, which were added up in the same order as calculateHours.
+    # The days without training have 0 like trainingHours gives them.
+    training = numpy.zeros(count)
+    trainedDays = numpy.flatnonzero(trained).tolist()
+    training[trainedDays] = [self.reports[i].trainingHours()
+                             for i in trainedDays]
+    hours = worked - training
+    manual = numpy.fromiter([dayReport.state == "manual"
+                             for dayReport in self.reports], bool, count)
+    for (dayReport, hoursValue, isManual) in zip(self.reports, hours.tolist(),
+                                                 manual.tolist()):
+      if not isManual:
+        dayReport.hoursCache = hoursValue
+        if dayReport.trainingCache is None:
+          dayReport.trainingCache = 0
+    manualDays = numpy.flatnonzero(manual).tolist()
+    hours[manualDays] = [self.reports[i].manual for i in manualDays]
+
+    # Add up the weeks. Each report adds its hours and then its training,
+    # which is the same order of additions as Timecards.fixup.
+    week = (self.day - timecards.kick_date.toordinal()) // 7
+    weights = numpy.column_stack((hours, training))
+    for (trackCode, track) in enumerate(self.tracks):
+      inTrack = numpy.flatnonzero(self.track == trackCode)
+      if len(inTrack) == 0:
+        continue
+      firstWeek = week[inTrack].min()
+      byWeek = numpy.bincount(numpy.repeat(week[inTrack] - firstWeek, 2),
+                              weights=weights[inTrack].ravel())
+      for w in numpy.unique(week[inTrack]).tolist():
+        track.byWeek[w] = track.byWeek.get(w, 0) + \
+                          byWeek[w - firstWeek].item()
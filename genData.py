@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Generates made up scanner data, since the real files have the girls'
+# names in them and can't be shared. It writes Opticon style *.TXT files
+# under <dataRoot>/<dump-date>/, a manual.yaml and a config.yaml for the
+# season, so that it can be run with runTimes.py or benchmark.py:
+#
+#   ./genData.py --students 100 --days 240 data/fake
+#   ./runTimes.py  (with config.yaml from data/fake.yaml)
+
+import argparse
+import datetime
+import os.path
+import random
+import yaml
+
+FIRST_NAMES = ["Ada", "Barbara", "Dorothy", "Edith", "Emmy", "Frances",
+               "Grace", "Hedy", "Jocelyn", "Katherine", "Lise", "Mae",
+               "Margaret", "Marie", "Mary", "Rosalind", "Sally", "Shirley",
+               "Sophie", "Valerie"]
+LAST_NAMES = ["Allen", "Bell", "Clarke", "Curie", "Easley", "Franklin",
+              "Germain", "Hamilton", "Hodgkin", "Hopper", "Jackson",
+              "Jemison", "Johnson", "Lamarr", "Lovelace", "McClintock",
+              "Meitner", "Noether", "Ride", "Vaughan", "Wu"]
+
+# the options for generate and their defaults
+DEFAULTS = {
+  'students': 80,
+  'start': datetime.date(2017, 9, 1),
+  'days': 240,
+  'scanners': 4,
+  'scansPerDay': 2.2,
+  'attendance': 0.35,
+  'duplicateRate': 0.05,
+  'oddRate': 0.04,
+  'trainings': 10,
+  'manual': 10,
+  'dumpDays': 14,
+  'seed': 1868,
+}
+
+# what each of the options is for
+HELP = {
+  'students': 'the number of students on the team',
+  'start': 'the first day of the season (MM/DD/YYYY)',
+  'days': 'the length of the season in days, at least 3 so that there '
+          'are days before kickoff',
+  'scanners': 'the number of scanners',
+  'scansPerDay': 'the average number of scans for a student on a day they '
+                 'come in',
+  'attendance': 'the part of the team that comes in on a given day',
+  'duplicateRate': 'the chance that a scan is repeated within a minute or two',
+  'oddRate': 'the chance that a student forgets to scan in or out',
+  'trainings': 'the number of training classes before kickoff',
+  'manual': 'the number of manual.yaml entries',
+  'dumpDays': 'the number of days between dumps of the scanners',
+  'seed': 'the seed for the random numbers, so the data can be made again',
+}
+
+def studentNames(count):
+  names = []
+  for i in range(count):
+    first = FIRST_NAMES[i % len(FIRST_NAMES)]
+    last = LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]
+    if i >= len(FIRST_NAMES) * len(LAST_NAMES):
+      last += str(i // (len(FIRST_NAMES) * len(LAST_NAMES)))
+    names.append("%s %s" % (first, last))
+  return names
+
+# The scans of one student on one day as a list(timestamp). They come in
+# during the afternoon or evening and sometimes stay past midnight.
+def studentDay(rand, day, options):
+  scans = []
+  count = max(2, int(rand.gauss(options['scansPerDay'], 0.5) + 0.5))
+  time = datetime.datetime.combine(day, datetime.time(13)) + \
+         datetime.timedelta(minutes=rand.randint(0, 6 * 60))
+  for i in range(count // 2):
+    checkOut = time + datetime.timedelta(minutes=rand.randint(30, 5 * 60))
+    scans += [time, checkOut]
+    time = checkOut + datetime.timedelta(minutes=rand.randint(10, 90))
+  if rand.random() < options['oddRate']:
+    del scans[rand.randrange(len(scans))]
+  for scan in list(scans):
+    if rand.random() < options['duplicateRate']:
+      scans.append(scan + datetime.timedelta(seconds=rand.randint(5, 110)))
+  return sorted(scans)
+
+# Write the data root, manual.yaml and a config for the season. Returns the
+# config.
+def generate(data_root, **settings):
+  options = dict(DEFAULTS)
+  options.update(settings)
+  rand = random.Random(options['seed'])
+  start = options['start']
+  end = start + datetime.timedelta(options['days'])
+  kickOff = start + datetime.timedelta(options['days'] * 4 // 10)
+  bagDate = kickOff + datetime.timedelta(45)
+  names = studentNames(options['students'])
+  scannerSerials = ["%d" % (105059 + i) for i in range(options['scanners'])]
+
+  # map((dump date, serial), list(row))
+  dumps = {}
+  day = start
+  while day < end:
+    dump = start + datetime.timedelta((day - start).days //
+                                      options['dumpDays'] *
+                                      options['dumpDays'])
+    for name in names:
+      if rand.random() < options['attendance']:
+        serial = rand.choice(scannerSerials)
+        for scan in studentDay(rand, day, options):
+          dumps.setdefault((dump, serial), []).append(
+            "%s,%s,%s,%s\n" % (name, serial, scan.strftime('%H:%M:%S'),
+                               scan.strftime('%m/%d/%Y')))
+    day += datetime.timedelta(1)
+  for ((dump, serial), rows) in dumps.items():
+    directory = os.path.join(data_root, dump.strftime('%m-%d'))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "%s.TXT" % serial), "w") as output:
+      output.write("# scanner %s\n" % serial)
+      output.writelines(rows)
+
+  os.makedirs(data_root, exist_ok=True)
+  manual = {}
+  for i in range(options['manual']):
+    track = rand.choice(['Technical', 'Business'])
+    date = kickOff + datetime.timedelta(rand.randrange(45))
+    manual.setdefault(track, {}).setdefault(date.strftime('%m/%d/%Y'), {})[
+      rand.choice(names)] = rand.randrange(1, 17) / 2
+  with open(os.path.join(data_root, "manual.yaml"), "w") as output:
+    yaml.safe_dump(manual, output, default_flow_style=False)
+
+  training = {}
+  for i in range(options['trainings']):
+    date = start + datetime.timedelta(rand.randrange((kickOff - start).days))
+    begin = rand.randint(14, 19)
+    training.setdefault("Class %d" % (i + 1), []).append(
+      "%s %02d:00 %02d:30" % (date.strftime('%m/%d/%Y'), begin, begin + 1))
+  return {
+    'startDate': start.strftime('%m/%d/%Y'),
+    'endDate': end.strftime('%m/%d/%Y'),
+    'kickOff': kickOff.strftime('%m/%d/%Y'),
+    'bagDate': bagDate.strftime('%m/%d/%Y'),
+    'businessScanner': scannerSerials[0],
+    'dataRoot': data_root,
+    'output': 'timecard.xlsx',
+    'tracks': {
+      'Pre-season': {'training': training},
+      'Technical': {'warn': 72, 'goal': 85.5, 'required': 90},
+      'Business': {'warn': 8, 'goal': 9.5, 'required': 10},
+      'Post-Bag': {'warn': 24, 'goal': 28, 'required': 32},
+    },
+  }
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Generate made up scanner data for testing.')
+  parser.add_argument('dataRoot', help='the directory to write the data to')
+  parser.add_argument('--config', metavar='FILE',
+                      help='where to write the config (<dataRoot>.yaml)')
+  for (option, default) in sorted(DEFAULTS.items()):
+    if option != 'start':
+      parser.add_argument('--' + option, type=type(default), default=default,
+                          help=HELP[option] + ' (default: %(default)s)')
+  parser.add_argument('--start', type=lambda s: datetime.datetime.strptime(
+                                    s, '%m/%d/%Y').date(),
+                      default=DEFAULTS['start'],
+                      help=HELP['start'] + ' (default: 09/01/2017)')
+  args = vars(parser.parse_args())
+  if args['days'] < 3:
+    parser.error('--days needs to be at least 3')
+  for option in ('students', 'scanners', 'dumpDays'):
+    if args[option] < 1:
+      parser.error('--%s needs to be at least 1' % option)
+  data_root = args.pop('dataRoot')
+  configFile = args.pop('config') or os.path.normpath(data_root) + '.yaml'
+  config = generate(data_root, **args)
+  with open(configFile, "w") as output:
+    yaml.safe_dump(config, output, default_flow_style=False)
+  print ("Wrote", data_root, "and", configFile)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Works out how many people were in the lab over the season from the
+# fixed up scans, for planning when mentors are needed. Every check in
+# and check out of every track is sorted once and swept in order,
+# keeping a count of who is checked in to each track. That gives the
+# intervals with a constant headcount, from which the peaks and the
+# hour of the week heatmaps are added up.
+
+import csv
+import datetime
+import scanners
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+            'Saturday', 'Sunday']
+
+# The pairs are taken from the Timecards unless they are given. A streamed
+# Timecards gives none and sweeps each day's pairs as it is finished,
+# since the days don't overlap. It doesn't keep the intervals, which
+# grow with the season.
+class Occupancy:
+  def __init__(self, timecards, pairs=None, keepIntervals=True):
+    self.trackNames = list(timecards.tracks)
+    # list((start, stop, map(track name, count), total)) for each time that
+    # someone was checked in and the count didn't change, or None if they
+    # aren't kept
+    self.intervals = [] if keepIntervals else None
+    # map(track name or None for all of them, (count, time)) with the
+    # first time that the highest count was reached
+    self.peaks = {}
+    # map(day, (count, time)) of the highest count for all of the tracks
+    self.dailyPeaks = {}
+    # map(track name or None for all of them, list(list(hours))) of the
+    # person hours for each weekday and hour of the day
+    self.hours = { name: [[0.0] * 24 for i in range(7)]
+                   for name in self.trackNames + [None] }
+    # list(list(count)) of the highest count for each weekday and hour
+    self.hourPeaks = [[0] * 24 for i in range(7)]
+    # set(date) of the days that someone was there
+    self.openDates = set()
+    if pairs is None:
+      pairs = timecards.intervals().pairs
+    self.sweep(pairs)
+
+  def sweep(self, pairs):
+    # list((time, change, track name)) where a check out sorts before a
+    # check in at the same time, since a pair covers [check in, check out)
+    changes = []
+    for (checkIn, checkOut, track, name) in pairs:
+      if checkIn < checkOut:
+        changes.append((checkIn, 1, track))
+        changes.append((checkOut, -1, track))
+    changes.sort(key=lambda change: change[:2])
+    counts = dict.fromkeys(self.trackNames, 0)
+    total = 0
+    i = 0
+    while i < len(changes):
+      time = changes[i][0]
+      while i < len(changes) and changes[i][0] == time:
+        (_, change, track) = changes[i]
+        counts[track] += change
+        total += change
+        i += 1
+      if total > 0:
+        self.addInterval(time, changes[i][0],
+                         { name: count for (name, count) in counts.items()
+                                       if count > 0 },
+                         total)
+
+  def addInterval(self, start, stop, counts, total):
+    if self.intervals is not None:
+      self.intervals.append((start, stop, counts, total))
+    for (name, count) in list(counts.items()) + [(None, total)]:
+      if count > self.peaks.get(name, (0, None))[0]:
+        self.peaks[name] = (count, start)
+    day = scanners.adjustDate(start)
+    if total > self.dailyPeaks.get(day, (0, None))[0]:
+      self.dailyPeaks[day] = (total, start)
+    # split the interval at the hours
+    time = start
+    while time < stop:
+      hourEnd = time.replace(minute=0, second=0, microsecond=0) + \
+                datetime.timedelta(hours=1)
+      end = min(hourEnd, stop)
+      hours = (end - time).total_seconds() / 3600
+      (weekday, hour) = (time.weekday(), time.hour)
+      for (name, count) in counts.items():
+        self.hours[name][weekday][hour] += count * hours
+      self.hours[None][weekday][hour] += total * hours
+      self.hourPeaks[weekday][hour] = max(self.hourPeaks[weekday][hour],
+                                          total)
+      self.openDates.add(time.date())
+      time = end
+
+  # The average number of people in each hour of each weekday on the days
+  # that someone was there, as list(list(count)).
+  def averages(self, trackName=None):
+    openDays = [0] * 7
+    for date in self.openDates:
+      openDays[date.weekday()] += 1
+    return [[hours / openDays[weekday] if openDays[weekday] else 0.0
+             for hours in self.hours[trackName][weekday]]
+            for weekday in range(7)]
+
+  # write the headcount of each interval to a CSV file
+  def writeCSV(self, filename):
+    with open(filename, 'w', newline='') as output:
+      writer = csv.writer(output)
+      writer.writerow(['Start', 'Stop'] + self.trackNames + ['Total'])
+      for (start, stop, counts, total) in self.intervals:
+        writer.writerow([start.isoformat(' '), stop.isoformat(' ')] +
+                        [counts.get(name, 0) for name in self.trackNames] +
+                        [total])
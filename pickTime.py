@@ -7,16 +7,79 @@
 
 # ./pickTime Technical 01/07/2017 14:30:00
 
+# It takes any number of times, so that a whole season's
+# group edits only need to read the scanner files once:
+
+# ./pickTime Technical 01/07/2017 14:30:00 01/14/2017 14:30:00
+
+# With --until it finds everyone who was checked in at any
+# time in a range:
+
+# ./pickTime Technical 01/07/2017 14:30:00 --until 01/07/2017 16:00:00
+
+# For a switch that happens on many days, a split rule in splits.yaml
+# moves everyone's time without any manual updates (see README.md).
+
+# Only the scans for the track and the days of the times are read, so
+# it doesn't have to wait for the whole season to be fixed up.
+
+import argparse
+import datetime
 import scanners
 import sys
 import yaml
 
+parser = argparse.ArgumentParser(
+  description='Find who was checked in to a track at the given times.')
+parser.add_argument('track', help='the track name or "all"')
+parser.add_argument('times', nargs='+', metavar='DATE TIME',
+                    help='dates (MM/DD/YYYY) and times (HH:MM:SS)')
+parser.add_argument('--until', nargs=2, metavar=('DATE', 'TIME'),
+                    help='find everyone checked in from the time until this')
+args = parser.parse_args()
+if len(args.times) % 2 != 0:
+  parser.error('each time needs a date and a time')
+times = [scanners.parseDateTime(args.times[i], args.times[i+1])
+         for i in range(0, len(args.times), 2)]
+if args.until:
+  if len(times) != 1:
+    parser.error('--until needs a single starting time')
+  until = scanners.parseDateTime(*args.until)
+  if until < times[0]:
+    parser.error('--until is before the starting time')
+  # every day from the start to the end of the range
+  days = [scanners.adjustDate(times[0]) + datetime.timedelta(i)
+          for i in range((scanners.adjustDate(until) -
+                          scanners.adjustDate(times[0])).days + 1)]
+else:
+  # a person checked in at a time has it in the scans for its day
+  days = [scanners.adjustDate(time) for time in times]
+
 # read configuration from config.yaml file
-config = yaml.load(open("config.yaml", "r"))
+with open("config.yaml", "r") as inputfile:
+  config = yaml.safe_load(inputfile)
 config['mangleNames'] = False
-date = scanners.parseDateTime(sys.argv[2], sys.argv[3])
+# the check ins are needed, which a streamed Timecards doesn't keep
+config['stream'] = False
+
+if args.track == 'all':
+  track = None
+elif args.track in config['tracks']:
+  track = args.track
+else:
+  sys.exit("Unknown track %s" % args.track)
+timecards = scanners.Timecards(config, days=days,
+                               trackNames=[track] if track else None)
+index = timecards.intervals()
 
-timecards = scanners.Timecards(config)
-track = timecards.tracks[sys.argv[1]]
-for name in track.namesAtTime(date):
-  print(name)
+if args.until:
+  for name in index.namesBetween(times[0], until, track):
+    print(name)
+elif len(times) == 1:
+  for name in index.namesAtTime(times[0], track):
+    print(name)
+else:
+  for time in times:
+    print(time.strftime('%m/%d/%Y %H:%M:%S'))
+    for name in index.namesAtTime(time, track):
+      print(' ', name)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Records the wall time, CPU time and peak memory of each phase of
+# building the timecards and the workbook, along with counters such as
+# the number of rows read, so that it is clear which phase to blame when
+# a run gets slow. runTimes.py --profile profile.json writes it out.
+#
+# The CPU time is only for this process, so it leaves out the workers of
+# --jobs. The peak memory is what Python allocated during the phase, from
+# tracemalloc, which is only turned on while profiling since it slows
+# everything down.
+
+import contextlib
+import json
+import time
+import tracemalloc
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+class Profile:
+  def __init__(self, enabled=True, cprofile=False):
+    self.enabled = enabled
+    # map(phase, map(stat, value)) in the order the phases first ran
+    self.phases = {}
+    # map(counter, count)
+    self.counters = {}
+    # the cProfile.Profile for the hot phases or None
+    self.profiler = None
+    if enabled and cprofile:
+      import cProfile
+      self.profiler = cProfile.Profile()
+
+  # Time the code in a with block as the named phase. If the phase runs
+  # more than once, the times are added up. The hot phases are also
+  # captured by cProfile if it is turned on.
+  @contextlib.contextmanager
+  def phase(self, name, hot=False):
+    if not self.enabled:
+      yield
+      return
+    if not tracemalloc.is_tracing():
+      tracemalloc.start()
+    tracemalloc.reset_peak()
+    startMemory = tracemalloc.get_traced_memory()[0]
+    startWall = time.perf_counter()
+    startCpu = time.process_time()
+    if hot and self.profiler:
+      self.profiler.enable()
+    try:
+      yield
+    finally:
+      if hot and self.profiler:
+        self.profiler.disable()
+      stats = self.phases.setdefault(name, {'calls': 0, 'wall': 0.0,
+                                            'cpu': 0.0, 'peakMemory': 0})
+      stats['calls'] += 1
+      stats['wall'] += time.perf_counter() - startWall
+      stats['cpu'] += time.process_time() - startCpu
+      stats['peakMemory'] = max(stats['peakMemory'],
+                                tracemalloc.get_traced_memory()[1] -
+                                startMemory)
+
+  def count(self, name, amount=1):
+    if self.enabled:
+      self.counters[name] = self.counters.get(name, 0) + amount
+
+  def results(self):
+    result = {'phases': self.phases, 'counters': self.counters}
+    if resource is not None:
+      # kilobytes on Linux, bytes on a Mac
+      result['maxRss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+  def write(self, filename):
+    with open(filename, 'w') as output:
+      json.dump(self.results(), output, indent=2)
+
+  # write the cProfile stats of the hot phases, which can be read with
+  # python -m pstats <filename>
+  def writeCProfile(self, filename):
+    self.profiler.dump_stats(filename)
+
+# used when nothing is being profiled
+NO_PROFILE = Profile(enabled=False)
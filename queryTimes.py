@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+# Answers questions from the database that runTimes.py --db saves,
+# without reading the scanner files or building a workbook.
+
+# ./queryTimes.py hours "Mouse%"     - hours per track for matching names
+# ./queryTimes.py weeks              - total hours per track for each week
+# ./queryTimes.py behind             - students below a track's warn hours
+
+import argparse
+import os.path
+import scandb
+import sys
+
+parser = argparse.ArgumentParser(
+  description='Query the timecard database.')
+parser.add_argument('--db', metavar='FILE', default='timecard.db',
+                    help='the database from runTimes.py --db')
+commands = parser.add_subparsers(dest='command')
+hours = commands.add_parser('hours', help='hours per track for students')
+hours.add_argument('name', help='a name pattern, with % as a wildcard')
+commands.add_parser('weeks', help='total hours per track for each week')
+commands.add_parser('behind', help='students below the warn hours')
+args = parser.parse_args()
+if args.command is None:
+  parser.error('a command is required')
+if not os.path.isfile(args.db):
+  sys.exit("No database %s, run ./runTimes.py --db %s first" %
+           (args.db, args.db))
+
+db = scandb.ScanDatabase(args.db)
+if args.command == 'hours':
+  for (name, track, total) in db.studentHours(args.name):
+    print("%-30s %-12s %7.2f" % (name, track, total))
+elif args.command == 'weeks':
+  for (week, track, total) in db.weeklyTotals():
+    print("Week %-4d %-12s %8.2f" % (week, track, total))
+elif args.command == 'behind':
+  for (name, track, total, warn) in db.belowWarn():
+    print("%-30s %-12s %7.2f < %g" % (name, track, total, warn))
+db.close()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# This builds the xlsx workbook from the Timecards. Every sheet is
+# written strictly in row order from values that are worked out before
+# the sheet is started, so the workbook can use xlsxwriter's
+# constant_memory mode, which writes each row out to disk as soon as the
+# next one starts instead of keeping the whole workbook in memory.
+
+import contextlib
+import io
+import occupancy
+import os.path
+import profiling
+
+def minState(left, right):
+  if left == "warn" or right == "warn":
+    return "warn"
+  elif left == "normal" or right == "normal":
+    return "normal"
+  elif left == "goal" or right == "goal":
+    return "goal"
+  else:
+    return "done"
+
+# The cells of a track's sheet for each person, with only the days that
+# they have hours for.
+class TrackRows:
+  def __init__(self, track, names):
+    self.track = track
+    self.trainingNames = sorted(track.trainingNames())
+    col = 1
+    # map(eventName, column)
+    self.eventColumns = {}
+    for eventName in self.trainingNames:
+      col += 1
+      self.eventColumns[eventName] = col
+    # map(date, column)
+    self.dateColumns = {}
+    for d in track.dates:
+      col += 1
+      self.dateColumns[d] = col
+    # map(name, list((column, hours, state)))
+    self.cells = {}
+    for name in names:
+      cells = []
+      for (eventName, hours) in sorted(track.eventTotals.get(name,
+                                                             {}).items()):
+        cells.append((self.eventColumns[eventName], hours, "normal"))
+      if name in track.people:
+        for (d, day) in sorted(track.people[name].times.items(),
+                               reverse=True):
+          cells.append((self.dateColumns[d], day.hours(), day.state))
+      self.cells[name] = cells
+
+class Report:
+  def __init__(self, timecards, outfile, constant_memory=False,
+               profile=profiling.NO_PROFILE, changes=None, lab=None):
+    self.timecards = timecards
+    self.changes = changes
+    # the Occupancy for its sheet, which is worked out from the timecards
+    # if it isn't given
+    self.lab = lab
+    self.profile = profile
+    # xlsxwriter takes a while to import, so it waits until a workbook is
+    # written
+    import xlsxwriter
+    self.workbook = xlsxwriter.Workbook(outfile,
+                                        {'constant_memory': constant_memory})
+    self.format_date = self.workbook.add_format({'num_format': 'mm/dd/yy'})
+    self.format_time = self.workbook.add_format(
+      {'num_format': 'mm/dd/yy hh:mm'})
+    self.format_count = self.workbook.add_format({'num_format': '0.0'})
+    self.black_total = self.makeColorFormat("white", True)
+    self.total_formats = {"warn": self.makeColorFormat("#ffcccc", True),
+                          "normal": self.black_total,
+                          "goal": self.makeColorFormat("#80ff00", True),
+                          "done": self.makeColorFormat("#00cc66", True)}
+    self.time_formats = {"normal": self.makeColorFormat("white", False),
+                         "error": self.makeColorFormat("yellow", False),
+                         "manual": self.makeColorFormat("#b7fcff", False)}
+
+  def makeColorFormat(self, color, isBold):
+    result = self.workbook.add_format({'num_format':'0.00'})
+    if color != "white":
+      result.set_bg_color(color)
+    if isBold:
+      result.set_bold()
+    return result
+
+  def getPrebagState(self, hours):
+    tech_track = self.timecards.tech_track
+    business_track = self.timecards.business_track
+    if hours >= (tech_track.required_hours + business_track.required_hours):
+      return "done"
+    elif hours >= (tech_track.goal_hours + business_track.goal_hours):
+      return "goal"
+    elif hours >= (tech_track.warn_hours + business_track.warn_hours):
+      return "normal"
+    else:
+      return "warn"
+
+  # The tracks in the order of their sheets. The standard tracks come
+  # first in the order that they have always been in, followed by the rest
+  # of the configured tracks.
+  def sheetTracks(self):
+    timecards = self.timecards
+    standard = [track for track in [timecards.tech_track,
+                                    timecards.business_track,
+                                    timecards.post_bag_track,
+                                    timecards.preseason_track]
+                      if track is not None]
+    return standard + [track for track in timecards.tracks.values()
+                             if track not in standard]
+
+  def write(self):
+    timecards = self.timecards
+    names = timecards.names()
+    with self.profile.phase('timesheet rows'):
+      rows = [TrackRows(track, names) for track in self.sheetTracks()]
+    with self.profile.phase('sheet Totals'):
+      if timecards.hasStandardTracks():
+        self.buildTotals(names)
+      else:
+        self.buildTrackTotals(names)
+    for trackRows in rows:
+      with self.profile.phase('sheet ' + trackRows.track.name):
+        self.buildTimesheet(names, trackRows)
+    with self.profile.phase('sheet Warnings'):
+      self.buildWarnings()
+    with self.profile.phase('sheet Occupancy'):
+      lab = self.lab or timecards.occupancy
+      if lab is None:
+        lab = occupancy.Occupancy(timecards)
+      self.buildOccupancy(lab)
+    if self.changes is not None:
+      with self.profile.phase('sheet Changes'):
+        self.buildChanges(self.changes)
+    with self.profile.phase('save workbook'):
+      self.workbook.close()
+
+  def buildTimesheet(self, names, trackRows):
+    track = trackRows.track
+    sheet = self.workbook.add_worksheet(track.name)
+    row = 0
+    sheet.write(row, 0, 'Name')
+    sheet.set_column(0, 0, 20)
+    sheet.write(row, 1, 'Total')
+    for eventName in trackRows.trainingNames:
+      sheet.write(row, trackRows.eventColumns[eventName], eventName)
+    for d in track.dates:
+      sheet.write(row, trackRows.dateColumns[d], d, self.format_date)
+
+    for name in names:
+      row = row + 1
+      sheet.write(row, 0, name)
+      sheet.write(row, 1, track.personTotal(name),
+                  self.total_formats[track.personState(name)])
+      for (col, hours, state) in trackRows.cells[name]:
+        sheet.write(row, col, hours, self.time_formats[state])
+
+  def buildTotals(self, names):
+    timecards = self.timecards
+    total_formats = self.total_formats
+    black_total = self.black_total
+    total_sheet = self.workbook.add_worksheet('Totals')
+    # The key and the requirements are next to the names, so the cells are
+    # collected first to be written in row order.
+    # map(row, list((column, value, format)))
+    cells = {}
+    def write(row, col, value, format=None):
+      cells.setdefault(row, []).append((col, value, format))
+
+    write(0, 0, 'Name')
+    total_sheet.set_column(0, 0, 20)
+    write(0, 1, 'Technical Hours')
+    total_sheet.set_column(1, 6, 15)
+    write(0, 2, 'Business Hours')
+    write(0, 3, 'Total Pre-Bag')
+    write(0, 4, 'Post-Bag Hours')
+    write(0, 5, 'Total Hours')
+    write(0, 6, 'Pre-Season Hours')
+    row = 0
+    for name in names:
+      row += 1
+      write(row, 0, name)
+      tech_total = timecards.tech_track.personTotal(name)
+      business_total = timecards.business_track.personTotal(name)
+      business_state = timecards.business_track.personState(name)
+      prebag_state = self.getPrebagState(tech_total + business_total)
+
+      write(row, 1, tech_total, black_total)
+      write(row, 2, business_total, total_formats[business_state])
+      write(row, 3, tech_total + business_total, total_formats[prebag_state])
+
+      post_bag_total = timecards.post_bag_track.personTotal(name)
+      post_bag_state = timecards.post_bag_track.personState(name)
+      write(row, 4, post_bag_total, total_formats[post_bag_state])
+      total_state = minState(minState(business_state, prebag_state),
+                             post_bag_state)
+
+      write(row, 5, post_bag_total + business_total + tech_total,
+            total_formats[total_state])
+      preseason_total = timecards.preseason_track.personTotal(name)
+      write(row, 6, preseason_total, black_total)
+
+    total_sheet.set_column(8, 8, 35)
+    write(0, 8, "Key:")
+    write(1, 8, "done", total_formats["done"])
+    write(2, 8, "ahead", total_formats["goal"])
+    write(3, 8, "keep going", total_formats["normal"])
+    write(4, 8, "behind", total_formats["warn"])
+
+    write(6, 8, "Requirements:")
+    write(7, 8, "Business: %d" % timecards.business_track.required_hours)
+    write(8, 8, "Pre-Bag (actually 2/28): %d" %
+                  (timecards.business_track.required_hours +
+                   timecards.tech_track.required_hours))
+    write(9, 8, "Post-Bag: %d" % timecards.post_bag_track.required_hours)
+    write(10, 8, "Total: Business, Pre-Bag, and Post-Bag")
+
+    # print out the breakdown of hours per week
+    row += 5
+    weeks = sorted(set([week for track in timecards.tracks.values()
+                             for week in track.byWeek.keys()]))
+    for week in weeks:
+      row += 1
+      write(row, 0, 'Week %d' % week)
+      tech = timecards.tech_track.byWeek.get(week, 0)
+      business = timecards.business_track.byWeek.get(week, 0)
+      preseason = timecards.preseason_track.byWeek.get(week, 0)
+      post_bag = timecards.post_bag_track.byWeek.get(week, 0)
+      write(row, 1, tech, black_total)
+      write(row, 2, business, black_total)
+      write(row, 3, tech + business, black_total)
+      write(row, 4, post_bag, black_total)
+      write(row, 5, tech + business + post_bag, black_total)
+      write(row, 6, preseason, black_total)
+
+    row += 1
+    write(row, 0, 'Total')
+    columnNames = "ABCDEFG"
+    for col in range(1, 7):
+      write(row, col,
+            '=SUM(%s%d:%s%d)' % (columnNames[col], row - len(weeks) + 1,
+                                 columnNames[col], row),
+            black_total)
+
+    for row in sorted(cells):
+      for (col, value, format) in cells[row]:
+        total_sheet.write(row, col, value, format)
+
+  # The Totals sheet for any set of tracks, with each person's hours in
+  # each track and overall, followed by the hours of each week.
+  def buildTrackTotals(self, names):
+    from xlsxwriter.utility import xl_col_to_name
+    tracks = self.sheetTracks()
+    total_formats = self.total_formats
+    black_total = self.black_total
+    total_sheet = self.workbook.add_worksheet('Totals')
+    # map(row, list((column, value, format)))
+    cells = {}
+    def write(row, col, value, format=None):
+      cells.setdefault(row, []).append((col, value, format))
+
+    write(0, 0, 'Name')
+    total_sheet.set_column(0, 0, 20)
+    total_sheet.set_column(1, len(tracks) + 1, 15)
+    for (col, track) in enumerate(tracks, 1):
+      write(0, col, '%s Hours' % track.name)
+    write(0, len(tracks) + 1, 'Total Hours')
+    row = 0
+    for name in names:
+      row += 1
+      write(row, 0, name)
+      for (col, track) in enumerate(tracks, 1):
+        write(row, col, track.personTotal(name),
+              total_formats[track.personState(name)])
+      write(row, len(tracks) + 1,
+            sum([track.personTotal(name) for track in tracks]), black_total)
+
+    keyCol = len(tracks) + 3
+    total_sheet.set_column(keyCol, keyCol, 35)
+    write(0, keyCol, "Key:")
+    write(1, keyCol, "done", total_formats["done"])
+    write(2, keyCol, "ahead", total_formats["goal"])
+    write(3, keyCol, "keep going", total_formats["normal"])
+    write(4, keyCol, "behind", total_formats["warn"])
+    write(6, keyCol, "Requirements:")
+    for (i, track) in enumerate(tracks):
+      write(7 + i, keyCol, "%s: %d" % (track.name, track.required_hours))
+
+    # print out the breakdown of hours per week
+    row += 5
+    weeks = sorted(set([week for track in tracks
+                             for week in track.byWeek.keys()]))
+    for week in weeks:
+      row += 1
+      write(row, 0, 'Week %d' % week)
+      for (col, track) in enumerate(tracks, 1):
+        write(row, col, track.byWeek.get(week, 0), black_total)
+      write(row, len(tracks) + 1,
+            sum([track.byWeek.get(week, 0) for track in tracks]), black_total)
+
+    row += 1
+    write(row, 0, 'Total')
+    for col in range(1, len(tracks) + 2):
+      column = xl_col_to_name(col)
+      write(row, col, '=SUM(%s%d:%s%d)' % (column, row - len(weeks) + 1,
+                                           column, row),
+            black_total)
+
+    for row in sorted(cells):
+      for (col, value, format) in cells[row]:
+        total_sheet.write(row, col, value, format)
+
+  def buildWarnings(self):
+    warn_sheet = self.workbook.add_worksheet('Warnings')
+    warn_sheet.write(0, 0, 'Level')
+    warn_sheet.write(0, 1, 'Name')
+    warn_sheet.set_column(1, 1, 20)
+    warn_sheet.write(0, 2, 'Date')
+    warn_sheet.write(0, 3, 'Track')
+    warn_sheet.write(0, 4, 'Warning')
+    warn_sheet.set_column(4, 4, 60)
+    row = 0
+    for (level, name, date, track, msg) in self.timecards.warnings:
+       row += 1
+       warn_sheet.write(row, 0, level)
+       warn_sheet.write(row, 1, name)
+       warn_sheet.write(row, 2, date, self.format_date)
+       warn_sheet.write(row, 3, track)
+       warn_sheet.write(row, 4, msg)
+
+  # The peak number of people in each track, a heatmap of the people in
+  # the lab by weekday and hour and the peak of each day.
+  def buildOccupancy(self, lab):
+    sheet = self.workbook.add_worksheet('Occupancy')
+    sheet.set_column(0, 0, 20)
+    sheet.set_column(2, 2, 15)
+    sheet.write(0, 0, 'Track')
+    sheet.write(0, 1, 'Peak')
+    sheet.write(0, 2, 'At')
+    row = 0
+    for name in [None] + lab.trackNames:
+      if name in lab.peaks:
+        (count, time) = lab.peaks[name]
+        row += 1
+        sheet.write(row, 0, name or 'All')
+        sheet.write(row, 1, count)
+        sheet.write(row, 2, time, self.format_time)
+
+    heatmaps = [('Average people on open days', lab.averages())] + \
+               [('Average people in %s' % name, lab.averages(name))
+                for name in lab.trackNames] + \
+               [('Most people', lab.hourPeaks)]
+    for (title, grid) in heatmaps:
+      row += 2
+      sheet.write(row, 0, title)
+      row += 1
+      for hour in range(24):
+        sheet.write(row, hour + 1, '%d:00' % hour)
+      for (weekday, counts) in enumerate(grid):
+        row += 1
+        sheet.write(row, 0, occupancy.WEEKDAYS[weekday])
+        for (hour, count) in enumerate(counts):
+          sheet.write(row, hour + 1, count, self.format_count)
+      sheet.conditional_format(row - 6, 1, row, 24,
+                               {'type': '2_color_scale',
+                                'min_color': '#ffffff',
+                                'max_color': '#f8696b'})
+
+    row += 2
+    sheet.write(row, 0, 'Day')
+    sheet.write(row, 1, 'Peak')
+    sheet.write(row, 2, 'At')
+    for (day, (count, time)) in sorted(lab.dailyPeaks.items()):
+      row += 1
+      sheet.write(row, 0, day, self.format_date)
+      sheet.write(row, 1, count)
+      sheet.write(row, 2, time, self.format_time)
+
+  # The totals, days and warnings that changed since the last run.
+  def buildChanges(self, changes):
+    sheet = self.workbook.add_worksheet('Changes')
+    sheet.set_column(0, 0, 20)
+    sheet.set_column(1, 1, 15)
+    sheet.write(0, 0, 'Changes since %s' % changes.since)
+    row = 2
+    for (col, heading) in enumerate(['Name', 'Track', 'Before', 'After',
+                                     'Change']):
+      sheet.write(row, col, heading)
+    for (name, track, before, after, oldState, state) in changes.totals:
+      row += 1
+      sheet.write(row, 0, name)
+      sheet.write(row, 1, track)
+      sheet.write(row, 2, before,
+                  self.total_formats.get(oldState, self.black_total))
+      sheet.write(row, 3, after,
+                  self.total_formats.get(state, self.black_total))
+      sheet.write(row, 4, after - before, self.black_total)
+
+    row += 2
+    for (col, heading) in enumerate(['Name', 'Track', 'Date', 'Before',
+                                     'After', 'Change']):
+      sheet.write(row, col, heading)
+    for (name, track, day, before, after, oldState, state) in changes.days:
+      row += 1
+      sheet.write(row, 0, name)
+      sheet.write(row, 1, track)
+      sheet.write(row, 2, day, self.format_date)
+      sheet.write(row, 3, before,
+                  self.time_formats.get(oldState, self.time_formats["normal"]))
+      sheet.write(row, 4, after,
+                  self.time_formats.get(state, self.time_formats["normal"]))
+      sheet.write(row, 5, after - before, self.time_formats["normal"])
+
+    row += 2
+    for (col, heading) in enumerate(['Level', 'Name', 'Date', 'Track',
+                                     'New Warning']):
+      sheet.write(row, col, heading)
+    for (level, name, date, track, msg) in changes.warnings:
+      row += 1
+      sheet.write(row, 0, level)
+      sheet.write(row, 1, name)
+      sheet.write(row, 2, date, self.format_date)
+      sheet.write(row, 3, track)
+      sheet.write(row, 4, msg)
+
+# When several configs have the same output, such as timecard.xlsx, name
+# each one's after its label, like 2016-timecard.xlsx. labels has the
+# label for each config.
+def uniqueOutputs(configs, labels):
+  outputs = [config['output'] for config in configs]
+  for (label, config) in zip(labels, configs):
+    if outputs.count(config['output']) > 1:
+      (directory, base) = os.path.split(config['output'])
+      config['output'] = os.path.join(directory, "%s-%s" % (label, base))
+
+# Build the Timecards and workbook for a config in a worker process, such
+# as for runSeasons.py and runTeams.py. Returns what it printed, so that
+# the workers' output doesn't get mixed together, and summary(timecards)
+# if there is a summary function.
+def buildReport(config, batches, overrides=None, constant_memory=False,
+                summary=None):
+  import scanners
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output):
+    timecards = scanners.Timecards(config, batches, overrides)
+    timecards.printSummary()
+    print ("Generating report", config['output'])
+    writeReport(timecards, config['output'], constant_memory)
+  return (output.getvalue(),
+          summary(timecards) if summary is not None else None)
+
+# Write the workbook for the timecards to outfile, with a Changes sheet
+# if changes has the changes.Changes since the last run.
+def writeReport(timecards, outfile, constant_memory=False,
+                profile=profiling.NO_PROFILE, changes=None, lab=None):
+  Report(timecards, outfile, constant_memory, profile, changes, lab).write()
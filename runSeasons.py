@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Regenerates the reports for several seasons at once, such as:
+#   ./runSeasons.py config-2016.yaml config-2017.yaml config.yaml
+# Each distinct dataRoot is only read once, its scans are split up by
+# each season's dates, and the seasons' Timecards and workbooks are built
+# in parallel worker processes.
+
+import argparse
+import concurrent.futures
+import os.path
+import report
+import scanners
+import yaml
+
+# Keep just the scans that fall in the season, so that the workers don't
+# get sent the whole data root.
+def seasonBatches(config, batches):
+  start = scanners.parseDate(config['startDate'])
+  end = scanners.parseDate(config['endDate'])
+  result = []
+  for batch in batches:
+    season = scanners.ScanBatch(batch.filename)
+    season.errors = batch.errors
+    (season.duplicates, season.duplicateOf) = (batch.duplicates,
+                                               batch.duplicateOf)
+    season.scans = [scan for scan in batch.scans
+                         if start <= scan[3] and scan[3] <= end]
+    result.append(season)
+  return result
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Build the timecard reports for several seasons.')
+  parser.add_argument('configs', nargs='+', metavar='CONFIG',
+                      help='the config.yaml files for the seasons')
+  parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                      help='number of processes to use')
+  parser.add_argument('--constant-memory', action='store_true',
+                      help='stream each sheet to disk a row at a time')
+  args = parser.parse_args()
+
+  configs = []
+  for filename in args.configs:
+    with open(filename, "r") as inputfile:
+      configs.append(yaml.safe_load(inputfile))
+
+  # The seasons usually all have output: timecard.xlsx, so if they clash
+  # name each one after its config file.
+  report.uniqueOutputs(configs,
+                       [os.path.splitext(os.path.basename(filename))[0]
+                        for filename in args.configs])
+
+  # read each data root once
+  roots = {}
+  for config in configs:
+    root = os.path.normpath(config['dataRoot'])
+    if root not in roots:
+      print ('Reading data root', config['dataRoot'])
+      roots[root] = (scanners.readDataRoot(config['dataRoot'], args.jobs,
+                                           scanners.scanCacheFile(config)),
+                     scanners.readOverrideFile(os.path.join(config['dataRoot'],
+                                                            "manual.yaml")))
+
+  with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+    seasons = []
+    for config in configs:
+      (batches, overrides) = roots[os.path.normpath(config['dataRoot'])]
+      seasons.append(pool.submit(report.buildReport, config,
+                                 seasonBatches(config, batches), overrides,
+                                 args.constant_memory))
+    for (filename, season) in zip(args.configs, seasons):
+      print ('Season', filename)
+      print (season.result()[0], end='')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Builds the reports for several teams that share a lab and copy all of
+# their scanners in to one data root:
+#   ./runTeams.py teams.yaml
+# where teams.yaml looks like:
+#
+#   dataRoot: data/shared
+#   summary: teams.xlsx
+#   teams:
+#     "1868":
+#       config: config-1868.yaml
+#       scanners: ["105059", "105060", "105061"]
+#     "1700":
+#       config: config-1700.yaml
+#       scanners: ["200001", "200002"]
+#
+# Each team's config is a normal config.yaml with its own season, tracks
+# and output. Its dataRoot has its manual.yaml and splits.yaml and
+# defaults to the shared data root. The data root is read once, each
+# scan is sent to the team that owns its scanner, and the teams'
+# Timecards and workbooks are built in parallel worker processes, with
+# the biggest teams started first. The summary workbook compares the
+# teams.
+
+import argparse
+import concurrent.futures
+import os.path
+import report
+import scanners
+import yaml
+
+# Split the batches up by team in one pass over the scans, keeping only
+# the scans in each team's season. The bad rows are left out, since they
+# can't be matched to a team. Returns map(team, list(ScanBatch)) and
+# map(serial, count) of the scans from scanners that no team owns.
+def shardBatches(batches, serialTeams, seasons):
+  shards = { team: [] for team in seasons }
+  unknown = {}
+  for batch in batches:
+    # map(team, ScanBatch) of the teams with scans in this file
+    teamBatches = {}
+    for scan in batch.scans:
+      team = serialTeams.get(scan[1])
+      if team is None:
+        unknown[scan[1]] = unknown.get(scan[1], 0) + 1
+        continue
+      (start, end) = seasons[team]
+      if start <= scan[3] and scan[3] <= end:
+        teamBatch = teamBatches.get(team)
+        if teamBatch is None:
+          teamBatch = teamBatches[team] = scanners.ScanBatch(batch.filename)
+        teamBatch.scans.append(scan)
+    for (team, teamBatch) in teamBatches.items():
+      shards[team].append(teamBatch)
+  return (shards, unknown)
+
+# the numbers for the summary workbook
+def teamSummary(timecards):
+  summary = {'people': len(timecards.names()), 'tracks': {}, 'done': {},
+             'errors': 0}
+  for track in timecards.tracks.values():
+    summary['tracks'][track.name] = sum(track.total.values())
+    summary['done'][track.name] = len([state for state in
+                                       track.states.values()
+                                       if state == "done"])
+  summary['errors'] = len([warn for warn in timecards.warnings
+                                if warn[0] == 'ERR'])
+  return summary
+
+# Write a workbook with a row for each team.
+def writeSummary(filename, teams, summaries):
+  import xlsxwriter
+  trackNames = []
+  for summary in summaries.values():
+    for name in summary['tracks']:
+      if name not in trackNames:
+        trackNames.append(name)
+  workbook = xlsxwriter.Workbook(filename)
+  hours = workbook.add_format({'num_format': '0.00'})
+  sheet = workbook.add_worksheet('Teams')
+  sheet.set_column(0, 0, 15)
+  sheet.set_column(1, 2 * len(trackNames) + 3, 15)
+  headings = ['Team', 'People'] + \
+             ['%s Hours' % name for name in trackNames] + ['Total Hours'] + \
+             ['%s Done' % name for name in trackNames] + ['Errors']
+  for (col, heading) in enumerate(headings):
+    sheet.write(0, col, heading)
+  for (row, team) in enumerate(teams, 1):
+    summary = summaries[team]
+    values = [(team, None), (summary['people'], None)] + \
+             [(summary['tracks'].get(name, 0.0), hours)
+              for name in trackNames] + \
+             [(sum(summary['tracks'].values()), hours)] + \
+             [(summary['done'].get(name, 0), None) for name in trackNames] + \
+             [(summary['errors'], None)]
+    for (col, (value, format)) in enumerate(values):
+      sheet.write(row, col, value, format)
+  workbook.close()
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Build the timecard reports for teams sharing a data root.')
+  parser.add_argument('teams', metavar='TEAMS',
+                      help='the teams.yaml file')
+  parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                      help='number of processes to use')
+  parser.add_argument('--constant-memory', action='store_true',
+                      help='stream each sheet to disk a row at a time')
+  args = parser.parse_args()
+
+  with open(args.teams, "r") as inputfile:
+    teamsConfig = yaml.safe_load(inputfile)
+  # map(team, config)
+  configs = {}
+  # map(serial, team)
+  serialTeams = {}
+  for (team, teamConfig) in teamsConfig['teams'].items():
+    team = str(team)
+    with open(teamConfig['config'], "r") as inputfile:
+      config = yaml.safe_load(inputfile)
+    config.setdefault('dataRoot', teamsConfig['dataRoot'])
+    config['jobs'] = 1
+    configs[team] = config
+    for serial in teamConfig['scanners']:
+      if str(serial) in serialTeams:
+        parser.error('scanner %s is in teams %s and %s' %
+                     (serial, serialTeams[str(serial)], team))
+      serialTeams[str(serial)] = team
+
+  # The teams usually all have output: timecard.xlsx, so if they clash
+  # name each one after its team.
+  report.uniqueOutputs(list(configs.values()), list(configs))
+
+  print ('Reading data root', teamsConfig['dataRoot'])
+  batches = scanners.readDataRoot(teamsConfig['dataRoot'], args.jobs,
+                                  scanners.scanCacheFile(teamsConfig))
+  for batch in batches:
+    scanners.printSkippedRows(batch)
+  (shards, unknown) = shardBatches(
+    batches, serialTeams,
+    { team: (scanners.parseDate(config['startDate']),
+             scanners.parseDate(config['endDate']))
+      for (team, config) in configs.items() })
+  for (serial, count) in sorted(unknown.items()):
+    print ("Warning: Skipping %d scans from scanner %s, which isn't in a team"
+           % (count, serial))
+
+  # start the biggest teams first, since they take the longest
+  order = sorted(configs, key=lambda team: -sum([len(batch.scans)
+                                                 for batch in shards[team]]))
+  with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+    builds = { team: pool.submit(report.buildReport, configs[team],
+                                 shards[team], None, args.constant_memory,
+                                 teamSummary)
+               for team in order }
+    summaries = {}
+    for team in configs:
+      (output, summaries[team]) = builds[team].result()
+      print ('Team', team)
+      print (output, end='')
+
+  summary = teamsConfig.get('summary', 'teams.xlsx')
+  print ("Generating summary", summary)
+  writeSummary(summary, list(configs), summaries)
+
+if __name__ == '__main__':
+  main()
@@ -20,211 +20,112 @@
 # Upload the file to Google Sheets using "File/Import/Upload/Replace".
 # After you upload, run the "Cookies/titles" macro to set the title bars.
 
-# I've been running this script in Python 3.5 on a Mac using MacPorts.
-# You'll need to install python35, py35-pip, and py35-readline.
+# The script needs Python 3.9 or later (the profiling uses
+# tracemalloc.reset_peak). On a Mac using MacPorts, you'll need to
+# install python39, py39-pip, and py39-readline.
 # You'll need to pip install XlsxWriter, and PyYAML.
 
 # 9/12/2014 - Partha Srinivasan initial cut
 
+import argparse
+import changes
+import occupancy
 import os.path
+import profiling
+import report
+import scandb
 import scanners
-import xlsxwriter
 import yaml
 
-def buildTimesheet(workbook, names, track):
-  sheet = workbook.add_worksheet(track.name)
-  row = 0
-  sheet.write(row, 0, 'Name')
-  sheet.set_column(0, 0, 20)
-  sheet.write(row, 1, 'Total')
-  col = 1
-  trainingNames = sorted(track.trainingNames())
-  for eventName in trainingNames:
-    col += 1
-    sheet.write(row, col, eventName)
-  for d in track.dates:
-    col += 1
-    sheet.write(row, col, d, format_date)
-
-  for name in names:
-    total = 0.0
-    row = row + 1
-    col = 1
-    sheet.write(row, 0, name)
-    for eventName in trainingNames:
-      col += 1
-      hours = track.trainingHours(name, eventName)
-      if hours != 0:
-        sheet.write(row, col, hours, time_formats["normal"])
-        total += hours
-    for d in track.dates:
-      col += 1
-      if name in track.people and d in track.people[name].times:
-        day = track.people[name].times[d]
-        hours = day.hours()
-        total += hours
-        sheet.write(row, col, hours, time_formats[day.state])
-    track.total[name] = total
-    sheet.write(row, 1, total, total_formats[track.getState(total)])
-
-# read configuration from config.yaml file
-config = yaml.load(open("config.yaml", "r"))
-outfile = config['output']
-
-timecards = scanners.Timecards(config)
-timecards.printSummary()
-print ("Generating report", outfile)
-
-# Now prep the xlsx workbook
-workbook  = xlsxwriter.Workbook(outfile)
-
-def makeColorFormat(color, isBold):
-  result = workbook.add_format({'num_format':'0.00'})
-  if color != "white":
-    result.set_bg_color(color)
-  if isBold:
-    result.set_bold()
-  return result
-
-def getPrebagState(hours):
-  if hours >= (timecards.tech_track.required_hours +
-               timecards.business_track.required_hours):
-    return "done"
-  elif hours >= (timecards.tech_track.goal_hours +
-                 timecards.business_track.goal_hours):
-    return "goal"
-  elif hours >= (timecards.tech_track.warn_hours +
-                 timecards.business_track.warn_hours):
-    return "normal"
-  else:
-    return "warn"
-  
-def minState(left, right):
-  if left == "warn" or right == "warn":
-    return "warn"
-  elif left == "normal" or right == "normal":
-    return "normal"
-  elif left == "goal" or right == "goal":
-    return "goal"
+def main():
+  parser = argparse.ArgumentParser(description='Build the timecard report.')
+  parser.add_argument('--jobs', '-j', type=int, default=1,
+                      help='number of processes for reading scanner files')
+  parser.add_argument('--backend', choices=['objects', 'columnar'],
+                      help='how to fix up the scans (columnar needs numpy)')
+  parser.add_argument('--constant-memory', action='store_true',
+                      help='stream each sheet to disk a row at a time')
+  parser.add_argument('--db', metavar='FILE',
+                      help='keep the scans and day reports in a SQLite database')
+  parser.add_argument('--stream', action='store_true',
+                      help='read the scanner files as one stream in day order, '
+                           'keeping only the totals of each day')
+  parser.add_argument('--profile', metavar='FILE',
+                      help='write the time and memory of each phase as JSON')
+  parser.add_argument('--cprofile', metavar='FILE',
+                      help='with --profile, write cProfile stats of the '
+                           'parsing, classifying and fixup')
+  parser.add_argument('--occupancy', metavar='FILE',
+                      help='write how many people were in the lab over time '
+                           'as CSV')
+  parser.add_argument('--changes', metavar='FILE',
+                      help='write what changed since the last run as JSON')
+  args = parser.parse_args()
+  if args.cprofile and not args.profile:
+    parser.error("--cprofile needs --profile")
+  if args.stream and args.occupancy:
+    parser.error("--occupancy needs every check in, which --stream doesn't "
+                 "keep")
+  profile = profiling.Profile(enabled=args.profile is not None,
+                              cprofile=args.cprofile is not None)
+
+  # read configuration from config.yaml file
+  with open("config.yaml", "r") as inputfile:
+    config = yaml.safe_load(inputfile)
+  config['jobs'] = args.jobs
+  if args.backend:
+    config['backend'] = args.backend
+  if args.stream:
+    config['stream'] = True
+  outfile = config['output']
+
+  if args.db:
+    db = scandb.ScanDatabase(args.db)
+    db.ingest(config['dataRoot'], args.jobs)
+    db.ingestOverrides(os.path.join(config['dataRoot'], "manual.yaml"))
+    timecards = scanners.Timecards(config, db.batches(), db.overrides(),
+                                   profile)
+    db.saveTimecards(timecards)
+    db.close()
   else:
-    return "done"
-
-format_date = workbook.add_format({'num_format': 'mm/dd/yy'})
-black_total = makeColorFormat("white", True)
-
-total_formats = {"warn": makeColorFormat("#ffcccc", True),
-                 "normal": black_total,
-                 "goal": makeColorFormat("#80ff00", True),
-                 "done": makeColorFormat("#00cc66", True)}
-
-time_formats = {"normal": makeColorFormat("white", False),
-                "error": makeColorFormat("yellow", False),
-                "manual": makeColorFormat("#b7fcff", False)}
-
-names = timecards.names()
-total_sheet = workbook.add_worksheet('Totals')
-buildTimesheet(workbook, names, timecards.tech_track)
-buildTimesheet(workbook, names, timecards.business_track)
-buildTimesheet(workbook, names, timecards.post_bag_track)
-buildTimesheet(workbook, names, timecards.preseason_track)
-
-total_sheet.write(0, 0, 'Name')
-total_sheet.set_column(0, 0, 20)
-total_sheet.write(0, 1, 'Technical Hours')
-total_sheet.set_column(1, 6, 15)
-total_sheet.write(0, 2, 'Business Hours')
-total_sheet.write(0, 3, 'Total Pre-Bag')
-total_sheet.write(0, 4, 'Post-Bag Hours')
-total_sheet.write(0, 5, 'Total Hours')
-total_sheet.write(0, 6, 'Pre-Season Hours')
-row = 0
-for name in timecards.names():
-  row += 1
-  total_sheet.write(row, 0, name)
-  tech_total = timecards.tech_track.total.get(name, 0.0)
-  business_total = timecards.business_track.total.get(name, 0.0)
-  business_state = timecards.business_track.getState(business_total)
-  prebag_state = getPrebagState(tech_total + business_total)
-  
-  total_sheet.write(row, 1, tech_total, black_total)
-  total_sheet.write(row, 2, business_total, total_formats[business_state])
-  total_sheet.write(row, 3, tech_total + business_total,
-                    total_formats[prebag_state])
-
-  post_bag_total = timecards.post_bag_track.total.get(name, 0.0)
-  post_bag_state = timecards.post_bag_track.getState(post_bag_total)
-  total_sheet.write(row, 4, post_bag_total, total_formats[post_bag_state])
-  total_state = minState(minState(business_state, prebag_state),
-                         post_bag_state)
-  
-  total_sheet.write(row, 5,
-                    post_bag_total + business_total + tech_total,
-                    total_formats[total_state])
-  preseason_total = timecards.preseason_track.total.get(name, 0.0)
-  total_sheet.write(row, 6, preseason_total, black_total)
-
-total_sheet.set_column(8, 8, 35)
-total_sheet.write(0, 8, "Key:")
-total_sheet.write(1, 8, "done", total_formats["done"])
-total_sheet.write(2, 8, "ahead", total_formats["goal"])
-total_sheet.write(3, 8, "keep going", total_formats["normal"])
-total_sheet.write(4, 8, "behind", total_formats["warn"])
-
-total_sheet.write(6, 8, "Requirements:")
-total_sheet.write(7, 8,
-                  "Business: %d" % timecards.business_track.required_hours)
-total_sheet.write(8, 8,
-                  "Pre-Bag (actually 2/28): %d" %
-                    (timecards.business_track.required_hours +
-                     timecards.tech_track.required_hours))
-total_sheet.write(9, 8,
-                  "Post-Bag: %d" % timecards.post_bag_track.required_hours)
-total_sheet.write(10, 8, "Total: Business, Pre-Bag, and Post-Bag")
-
-# print out the breakdown of hours per week
-row += 5
-weeks = sorted(set([week for track in timecards.tracks.values()
-                         for week in track.byWeek.keys()]))
-for week in weeks:
-  row += 1
-  total_sheet.write(row, 0, 'Week %d' % week)
-  tech = timecards.tech_track.byWeek.get(week, 0)
-  business = timecards.business_track.byWeek.get(week, 0)
-  preseason = timecards.preseason_track.byWeek.get(week, 0)
-  post_bag = timecards.post_bag_track.byWeek.get(week, 0)
-  total_sheet.write(row, 1, tech, black_total)
-  total_sheet.write(row, 2, business, black_total)
-  total_sheet.write(row, 3, tech + business, black_total)
-  total_sheet.write(row, 4, post_bag, black_total)
-  total_sheet.write(row, 5, tech + business + post_bag, black_total)
-  total_sheet.write(row, 6, preseason, black_total)
-  
-row += 1
-total_sheet.write(row, 0, 'Total')
-columnNames = "ABCDEFG"
-for col in range(1, 7):
-  total_sheet.write(row, col,
-                    '=SUM(%s%d:%s%d)' % (columnNames[col],
-                                         row - len(weeks) + 1,
-                                         columnNames[col], row),
-                    black_total)
-
-
-warn_sheet = workbook.add_worksheet('Warnings')
-warn_sheet.write(0, 0, 'Level')
-warn_sheet.write(0, 1, 'Name')
-warn_sheet.set_column(1, 1, 20)
-warn_sheet.write(0, 2, 'Date')
-warn_sheet.write(0, 3, 'Track')
-warn_sheet.write(0, 4, 'Warning')
-warn_sheet.set_column(4, 4, 60)
-row = 0
-for (level, name, date, track, msg) in timecards.warnings:
-   row += 1
-   warn_sheet.write(row, 0, level)
-   warn_sheet.write(row, 1, name)
-   warn_sheet.write(row, 2, date, format_date)
-   warn_sheet.write(row, 3, track)
-   warn_sheet.write(row, 4, msg)
-
-workbook.close()
+    timecards = scanners.Timecards(config, profile=profile)
+  timecards.printSummary()
+
+  # compare with the snapshot from the last run
+  snapshotFile = changes.snapshotFile(config)
+  snapshot = None
+  delta = None
+  if snapshotFile:
+    with profile.phase('snapshot'):
+      snapshot = changes.takeSnapshot(timecards)
+      old = changes.readSnapshot(snapshotFile)
+      if old is not None:
+        delta = changes.Changes(old, snapshot)
+        delta.printSummary()
+  # a streamed Timecards has swept its own Occupancy as it went
+  lab = timecards.occupancy
+  if lab is None:
+    with profile.phase('occupancy'):
+      lab = occupancy.Occupancy(timecards)
+  print ("Generating report", outfile)
+
+  report.writeReport(timecards, outfile, args.constant_memory, profile, delta,
+                     lab)
+  if args.changes:
+    if delta is None:
+      print ("Warning: No earlier snapshot for", args.changes)
+    else:
+      print ("Writing changes", args.changes)
+      delta.writeJSON(args.changes)
+  if snapshot is not None:
+    changes.writeSnapshot(snapshotFile, snapshot)
+  if args.occupancy:
+    print ("Writing occupancy", args.occupancy)
+    lab.writeCSV(args.occupancy)
+  if args.profile:
+    profile.write(args.profile)
+    if args.cprofile:
+      profile.writeCProfile(args.cprofile)
+
+if __name__ == '__main__':
+  main()
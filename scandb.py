@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# This keeps the scans, manual updates, training events and the fixed up
+# day reports in a SQLite database, so that they outlive a single run.
+# runTimes.py --db timecard.db adds any new or changed scanner files to the
+# database, builds the Timecards from it, saves the day reports back and
+# then writes the workbook. queryTimes.py answers questions from the saved
+# day reports without reading the scanner files again.
+
+import archives
+import datetime
+import sqlite3
+import scanners
+
+SCHEMA = '''
+create table if not exists files (
+  path text primary key,
+  size integer,
+  mtime integer,
+  digest blob,
+  serial text,
+  hashes blob,
+  duplicates integer,
+  duplicate_of text);
+create table if not exists scans (
+  file text,
+  name text,
+  serial text,
+  time text,
+  day text);
+create index if not exists scans_file on scans (file);
+create index if not exists scans_name on scans (name, day);
+create index if not exists scans_day on scans (day);
+create table if not exists scan_errors (
+  file text,
+  line integer,
+  message text);
+create table if not exists overrides (
+  track text,
+  day text,
+  name text,
+  hours real,
+  primary key (track, day, name));
+create table if not exists tracks (
+  name text primary key,
+  required real,
+  warn real,
+  goal real);
+create table if not exists events (
+  track text,
+  name text,
+  start text,
+  stop text);
+create table if not exists day_reports (
+  track text,
+  name text,
+  day text,
+  week integer,
+  hours real,
+  training real,
+  state text,
+  primary key (track, name, day));
+create index if not exists day_reports_name on day_reports (name);
+create index if not exists day_reports_day on day_reports (track, day);
+create table if not exists warnings (
+  level text,
+  name text,
+  day text,
+  track text,
+  message text);
+'''
+
+# the columns that were added to the files table after it was created, for
+# the rows that a scanner dump repeats from an earlier one
+FILE_COLUMNS = [('serial', 'text'), ('hashes', 'blob'),
+                ('duplicates', 'integer'), ('duplicate_of', 'text')]
+
+class ScanDatabase:
+  def __init__(self, filename):
+    self.db = sqlite3.connect(filename)
+    self.db.executescript(SCHEMA)
+    columns = set([row[1] for row in
+                   self.db.execute('pragma table_info(files)')])
+    with self.db:
+      for (name, kind) in FILE_COLUMNS:
+        if name not in columns:
+          self.db.execute('alter table files add column %s %s' % (name, kind))
+
+  def close(self):
+    self.db.close()
+
+  # Add the scanner files under the data root that are new or have changed
+  # since they were last added and drop the ones that are gone. The rows
+  # at the start of a file that are in an earlier dump from the same
+  # scanner are left out (see scanners.overlappingDumps), so a file is
+  # also parsed again when that changes. Returns the number of files that
+  # were parsed.
+  def ingest(self, data_root, jobs=1):
+    files = scanners.findScannerFiles(data_root)
+    known = { row[0]: row[1:] for row in self.db.execute(
+                'select path, size, mtime, digest, serial, hashes, '
+                'duplicates, duplicate_of from files') }
+    # map(file, fingerprint) of the files whose fingerprints are known
+    fingerprints = {}
+    for file in files:
+      stat = archives.stat(file)
+      key = known.get(file)
+      if key is not None and key[4] is not None and \
+         key[0] == stat.st_size and \
+         (key[1] == stat.st_mtime_ns or key[2] == scanners.fileDigest(file)):
+        fingerprints[file] = (key[3], key[4])
+    new = [file for file in files if file not in fingerprints]
+    fingerprints.update(zip(new, scanners.fingerprintScannerFiles(new, jobs)))
+    overlaps = scanners.overlappingDumps(fingerprints)
+    changed = [file for file in files
+               if file in new or
+                  tuple(known[file][5:]) != overlaps.get(file, (0, None))]
+    with self.db:
+      for path in set(known) - set(files):
+        self.removeFile(path)
+      for batch in scanners.readScannerFiles(
+          changed, jobs, skips=[overlaps.get(file, (0, None))[0]
+                                for file in changed]):
+        self.removeFile(batch.filename)
+        stat = archives.stat(batch.filename)
+        (serial, hashes) = fingerprints[batch.filename]
+        self.db.execute('insert into files values (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (batch.filename, stat.st_size, stat.st_mtime_ns,
+                         scanners.fileDigest(batch.filename), serial, hashes,
+                         batch.duplicates,
+                         overlaps.get(batch.filename, (0, None))[1]))
+        self.db.executemany('insert into scans values (?, ?, ?, ?, ?)',
+                            [(batch.filename, name, serial,
+                              dt.isoformat(' '), day.isoformat())
+                             for (name, serial, dt, day) in batch.scans])
+        self.db.executemany('insert into scan_errors values (?, ?, ?)',
+                            [(batch.filename, line, message)
+                             for (line, message) in batch.errors])
+    return len(changed)
+
+  def removeFile(self, path):
+    self.db.execute('delete from files where path = ?', (path,))
+    self.db.execute('delete from scans where file = ?', (path,))
+    self.db.execute('delete from scan_errors where file = ?', (path,))
+
+  # replace the manual updates with the ones from a manual.yaml file
+  def ingestOverrides(self, filename):
+    with self.db:
+      self.db.execute('delete from overrides')
+      for (trackName, dateList) in scanners.readOverrideFile(filename).items():
+        for (dateStr, hoursList) in (dateList or {}).items():
+          day = scanners.parseDate(dateStr).isoformat()
+          for (name, hours) in hoursList.items():
+            self.db.execute('insert or replace into overrides '
+                            'values (?, ?, ?, ?)',
+                            (trackName, day, name, hours))
+
+  # the ScanBatch for each file, ordered by the file name
+  def batches(self):
+    result = []
+    byFile = {}
+    for (file, duplicates, duplicateOf) in self.db.execute(
+        'select path, duplicates, duplicate_of from files order by path'):
+      batch = byFile[file] = scanners.ScanBatch(file)
+      (batch.duplicates, batch.duplicateOf) = (duplicates or 0, duplicateOf)
+      result.append(batch)
+    dates = {}
+    for (file, name, serial, time, day) in self.db.execute(
+        'select file, name, serial, time, day from scans '
+        'order by file, rowid'):
+      batch = byFile[file]
+      if day not in dates:
+        dates[day] = datetime.date.fromisoformat(day)
+      batch.scans.append((name, serial, datetime.datetime.fromisoformat(time),
+                          dates[day]))
+    for (file, line, message) in self.db.execute(
+        'select file, line, message from scan_errors order by file, line'):
+      if file in byFile:
+        byFile[file].errors.append((line, message))
+    return result
+
+  # the manual updates in the same form as manual.yaml
+  def overrides(self):
+    result = {}
+    for (track, day, name, hours) in self.db.execute(
+        'select track, day, name, hours from overrides order by rowid'):
+      dateStr = datetime.date.fromisoformat(day).strftime('%m/%d/%Y')
+      result.setdefault(track, {}).setdefault(dateStr, {})[name] = hours
+    return result
+
+  # Replace the tracks, training events, day reports and warnings with the
+  # ones from the fixed up Timecards.
+  def saveTimecards(self, timecards):
+    with self.db:
+      for table in ['tracks', 'events', 'day_reports', 'warnings']:
+        self.db.execute('delete from %s' % table)
+      for track in timecards.tracks.values():
+        self.db.execute('insert into tracks values (?, ?, ?, ?)',
+                        (track.name, track.required_hours, track.warn_hours,
+                         track.goal_hours))
+        self.db.executemany('insert into events values (?, ?, ?, ?)',
+                            [(track.name, event.name,
+                              event.start.isoformat(' '),
+                              event.stop.isoformat(' '))
+                             for event in track.training])
+        self.db.executemany(
+          'insert into day_reports values (?, ?, ?, ?, ?, ?, ?)',
+          [(track.name, name, date.isoformat(),
+            (date - timecards.kick_date).days // 7,
+            report.hours(), report.trainingHours(), report.state)
+           for (name, person) in track.people.items()
+           for (date, report) in person.times.items()])
+      self.db.executemany('insert into warnings values (?, ?, ?, ?, ?)',
+                          [(level, name, date.isoformat(), track, msg)
+                           for (level, name, date, track, msg)
+                           in timecards.warnings])
+
+  # list((track, hours)) for the names that match the pattern (as in SQL's
+  # like)
+  def studentHours(self, pattern):
+    return self.db.execute(
+      'select name, track, sum(hours + training) from day_reports '
+      'where name like ? group by name, track order by name, track',
+      (pattern,)).fetchall()
+
+  # list((week, track, hours))
+  def weeklyTotals(self):
+    return self.db.execute(
+      'select week, track, sum(hours + training) from day_reports '
+      'group by week, track order by week, track').fetchall()
+
+  # list((name, track, hours, warn)) for the students whose hours in a
+  # track are below its warn threshold
+  def belowWarn(self):
+    return self.db.execute(
+      'select people.name, tracks.name, coalesce(sum(hours + training), 0), '
+      '  tracks.warn '
+      'from (select distinct name from day_reports) as people '
+      'cross join tracks '
+      'left join day_reports on day_reports.name = people.name '
+      '  and day_reports.track = tracks.name '
+      'group by people.name, tracks.name '
+      'having coalesce(sum(hours + training), 0) < tracks.warn '
+      'order by tracks.name, people.name').fetchall()
@@ -13,14 +13,19 @@
 #  * time - time code in 24HR HH:MM:SS format
 #  * date - date code in MM/DD/YYYY format.
 
+# yaml, hashlib and concurrent.futures are imported where they are used,
+# so that the commands that only need a quick answer start quickly.
+import archives
+import array
+import bisect
 import csv
 import datetime
 import functools
-import glob
 import operator
 import os.path
+import pickle
+import profiling
 import sys
-import yaml
 
 # ignore events less than 2 minutes apart
 MIN_SEPARATION = 120
@@ -45,6 +50,43 @@ def parseDateShortTime(date, time):
 def adjustDate(ts):
   return (ts - datetime.timedelta(0, 4 * 3600)).date()
 
+# The scanners always write MM/DD/YYYY and HH:MM:SS, so the hot loop avoids
+# strptime for that format. Every date repeats for all of the scans on
+# that day, so each one is only parsed once.
+# map(date string, (year, month, day, date, previous date))
+_scanDates = {}
+
+def _parseScanDate(date):
+  if (len(date) == 10 and date[2] == '/' and date[5] == '/' and
+      (date[0:2] + date[3:5] + date[6:10]).isdigit()):
+    d = datetime.date(int(date[6:10]), int(date[0:2]), int(date[3:5]))
+  else:
+    d = parseDate(date)
+  return (d.year, d.month, d.day, d, d - datetime.timedelta(1))
+
+def _scanDate(date):
+  parsed = _scanDates.get(date)
+  if parsed is None:
+    parsed = _scanDates[date] = _parseScanDate(date)
+  return parsed
+
+# parse the date and time fields of a scan, returning the timestamp and
+# the day it counts for. This gives the same answer as
+# parseDateTime(date, time) and adjustDate, but is much faster.
+# Raises ValueError for fields that aren't in the scanner's format.
+def parseScan(date, time):
+  parsed = _scanDate(date)
+  if (len(time) == 8 and time[2] == ':' and time[5] == ':' and
+      (time[0:2] + time[3:5] + time[6:8]).isdigit()):
+    hour = int(time[0:2])
+    ts = datetime.datetime(parsed[0], parsed[1], parsed[2],
+                           hour, int(time[3:5]), int(time[6:8]))
+  else:
+    t = datetime.datetime.strptime(time, '%H:%M:%S').time()
+    hour = t.hour
+    ts = datetime.datetime.combine(parsed[3], t)
+  return ts, parsed[4] if hour < 4 else parsed[3]
+
 def calculateHours(times):
   result = 0.0
   i = 0
@@ -63,8 +105,38 @@ def mangleName(name):
   else:
     return "%s, %s" % (parts[1], parts[0])
 
+# Gives each person's name an integer id the first time it is seen and
+# remembers the name that each raw name from the scanners or manual.yaml
+# turns into, so that each distinct raw name is only mangled once. The
+# same name is always the same string object.
+class NameRegistry:
+  def __init__(self, mangle=True):
+    self.mangle = mangle
+    # map(raw name, name)
+    self.canonical = {}
+    # map(name, id)
+    self.ids = {}
+    # list(name) indexed by id
+    self.names = []
+
+  def name(self, rawName):
+    name = self.canonical.get(rawName)
+    if name is None:
+      name = mangleName(rawName) if self.mangle else rawName
+      nameId = self.ids.get(name)
+      if nameId is None:
+        nameId = self.ids[name] = len(self.names)
+        self.names.append(name)
+      name = self.canonical[rawName] = self.names[nameId]
+    return name
+
+  def id(self, name):
+    return self.ids[name]
+
 # training classes, which are tracked separately from their track
 class Event:
+  __slots__ = ('name', 'start', 'stop')
+
   def __init__(self, name, times_str):
     self.name = name
     [date_str, start_str, stop_str] = times_str.split()
@@ -83,8 +155,44 @@ def parseEvents(event_list):
       result.append(Event(name, time))
   return result
 
+# A rule that moves everyone's time after a given time on a day from one
+# track to another, such as when the whole team switches from technical
+# to business at 2:30. They are written as "<date> <HH:MM> <from> to <to>"
+# in <dataRoot>/splits.yaml.
+class SplitRule:
+  __slots__ = ('time', 'day', 'source', 'target')
+
+  def __init__(self, rule_str):
+    [date_str, time_str, self.source, to, self.target] = rule_str.split()
+    if to != 'to':
+      raise ValueError("Bad split rule: %s" % rule_str)
+    self.time = parseDateShortTime(date_str, time_str)
+    self.day = adjustDate(self.time)
+
+  def __repr__(self):
+    return "%s to %s at %s" % (self.source, self.target, self.time)
+
+# Read the split rules file, returning map(day, list(SplitRule)) with
+# each day's rules in time order, which is empty if there is no file.
+def readSplitFile(filename):
+  rules = []
+  if archives.isFile(filename):
+    import yaml
+    with archives.openFile(filename, "r") as inputfile:
+      rules = [SplitRule(rule) for rule in yaml.safe_load(inputfile) or []]
+  return splitsByDay(rules)
+
+def splitsByDay(rules):
+  result = {}
+  for rule in sorted(rules, key=operator.attrgetter('time')):
+    result.setdefault(rule.day, []).append(rule)
+  return result
+
 # Stores the scans of a single student on the same day
 class DayReport:
+   __slots__ = ('scans', 'ignored', 'state', 'manual', 'training',
+                'hoursCache', 'trainingCache')
+
    def __init__(self):
       self.scans = []
       self.ignored = []
@@ -92,6 +200,9 @@ class DayReport:
       self.manual = 0
       # map(eventName, hours)
       self.training = {}
+      # the hours and the training hours, once they are asked for
+      self.hoursCache = None
+      self.trainingCache = None
 
    # after the data is loaded, fix up the data
    def fixUp(self, name, date, track, trainings, warnings):
@@ -123,20 +234,71 @@ class DayReport:
            self.scans = self.scans[1:]
          else:
            self.scans = self.scans[:-1]
+      self.invalidate()
+      self.addTrainings(trainings)
+
+   # add the hours that the person was at each of the trainings
+   def addTrainings(self, trainings):
       for event in trainings:
         eventHours = self.eventHours(event)
         if eventHours > 0:
-          self.training[event.name] = \
-            self.training.get(event.name, 0) + eventHours
+          self.addTraining(event.name, eventHours)
+
+   # Move the time after the given time in to a new DayReport, which is
+   # returned, or None if there isn't any. A check in/check out pair that
+   # spans the time is split in two. The training hours of both need to
+   # be added again.
+   def splitAt(self, time):
+      kept = []
+      moved = []
+      for i in range(0, len(self.scans) - 1, 2):
+        (checkIn, checkOut) = (self.scans[i], self.scans[i+1])
+        if checkOut <= time:
+          kept += [checkIn, checkOut]
+        elif checkIn >= time:
+          moved += [checkIn, checkOut]
+        else:
+          kept += [checkIn, time]
+          moved += [time, checkOut]
+      if len(moved) == 0:
+        return None
+      self.scans = kept
+      self.training = {}
+      self.invalidate()
+      result = DayReport()
+      result.scans = moved
+      return result
+
+   # add the check in/check out pairs of another report for the same day
+   def merge(self, other):
+      pairs = sorted([(self.scans[i], self.scans[i+1])
+                      for i in range(0, len(self.scans) - 1, 2)] +
+                     [(other.scans[i], other.scans[i+1])
+                      for i in range(0, len(other.scans) - 1, 2)])
+      self.scans = [time for pair in pairs for time in pair]
+      self.training = {}
+      self.invalidate()
 
    def append(self, time):
       self.scans.append(time)
+      self.invalidate()
 
    # manually override the hours to the given value
    def manualUpdate(self, hours):
       self.state = "manual"
       self.manual = hours
       self.scans = []
+      self.invalidate()
+
+   def addTraining(self, eventName, hours):
+      self.training[eventName] = self.training.get(eventName, 0) + hours
+      self.invalidate()
+
+   # forget the cached hours, which must be called when the scans or the
+   # training are changed from outside
+   def invalidate(self):
+      self.hoursCache = None
+      self.trainingCache = None
 
    # was this student checked in at this time?
    def checkedIn(self, time):
@@ -149,10 +311,12 @@ class DayReport:
      return result
 
    def hours(self):
-     if self.state == "manual":
-       return self.manual
-     else:
-       return calculateHours(self.scans) - self.trainingHours()
+     if self.hoursCache is None:
+       if self.state == "manual":
+         self.hoursCache = self.manual
+       else:
+         self.hoursCache = calculateHours(self.scans) - self.trainingHours()
+     return self.hoursCache
 
 
    # If the person was checked in during the event, calculate the hours
@@ -172,10 +336,88 @@ class DayReport:
      return result
 
    def trainingHours(self):
-     return functools.reduce(operator.add, self.training.values(), 0)
+     if self.trainingCache is None:
+       self.trainingCache = functools.reduce(operator.add,
+                                             self.training.values(), 0)
+     return self.trainingCache
+
+# The hours of a finished DayReport without its scans, which is all that
+# the totals and the report need. A streamed Timecards keeps these in
+# place of its day reports, so it has no check in/check out pairs.
+class DayTotal:
+   __slots__ = ('state', 'training', 'hoursValue', 'trainingValue')
+
+   scans = ()
+   ignored = ()
+
+   def __init__(self, report):
+      self.state = report.state
+      self.training = report.training
+      self.hoursValue = report.hours()
+      self.trainingValue = report.trainingHours()
+
+   def hours(self):
+     return self.hoursValue
+
+   def trainingHours(self):
+     return self.trainingValue
+
+# Work out the training hours of all of the day reports in a track with a
+# single sweep over the training events and the check in/check out pairs,
+# sorted by when they start. Whichever of an overlapping event and pair
+# starts second finds the other one still active, so each overlap is found
+# exactly once. The hours are added up in the same order as
+# DayReport.eventHours, so the results are identical.
+def attributeTraining(track):
+  if len(track.training) == 0:
+    return
+  # list((start, kind, index)) where kind 0 is an event and 1 is a pair
+  starts = [(event.start, 0, i) for (i, event) in enumerate(track.training)]
+  # list((check in, check out, report, pair number))
+  pairs = []
+  for person in track.people.values():
+    for report in person.times.values():
+      if report.state != "manual":
+        for i in range(0, len(report.scans) - 1, 2):
+          starts.append((report.scans[i], 1, len(pairs)))
+          pairs.append((report.scans[i], report.scans[i+1], report, i))
+  starts.sort(key=operator.itemgetter(0, 1))
+  # map(report, map(event index, list((pair number, seconds))))
+  overlaps = {}
+  activeEvents = []
+  activePairs = []
+  for (time, kind, i) in starts:
+    if kind == 0:
+      activePairs = [p for p in activePairs if pairs[p][1] > time]
+      activeEvents.append(i)
+      found = activePairs
+      eventsFound = [i]
+    else:
+      activeEvents = [e for e in activeEvents
+                        if track.training[e].stop > time]
+      activePairs.append(i)
+      found = [i]
+      eventsFound = activeEvents
+    for p in found:
+      (checkIn, checkOut, report, number) = pairs[p]
+      for e in eventsFound:
+        event = track.training[e]
+        eventCheckIn = event.start if checkIn < event.start else checkIn
+        eventCheckOut = event.stop if event.stop < checkOut else checkOut
+        overlaps.setdefault(report, {}).setdefault(e, []).append(
+          (number, (eventCheckOut - eventCheckIn).seconds))
+  for (report, events) in overlaps.items():
+    for e in sorted(events):
+      eventHours = 0
+      for (number, seconds) in sorted(events[e]):
+        eventHours += seconds / 3600
+      if eventHours > 0:
+        report.addTraining(track.training[e].name, eventHours)
 
 # All of the information about a person with in a single track
 class PersonInTrack:
+  __slots__ = ('times',)
+
   def __init__(self):
     # map(date, DayReport)
     self.times = {}
@@ -204,26 +446,74 @@ class Track:
     self.dates = []
     # map(name, hours)
     self.total = {}
+    # map(name, state of their total)
+    self.states = {}
     # map(week, hours)
     self.byWeek = {}
     # list(Event)
     self.training = parseEvents(trainings)
+    # map(name, map(eventName, hours))
+    self.eventTotals = {}
+    # IntervalIndex of the fixed up scans, built when it is first needed
+    self.index = None
+
+  def intervals(self):
+    if self.index is None:
+      self.index = IntervalIndex([self])
+    return self.index
 
   # Generates the list of names that were checked in to this track at the
   # given time
   def namesAtTime(self, time):
-    date = adjustDate(time)
-    return sorted([name for (name, person) in self.people.items()
-                        if date in person.times and
-                           person.times[date].checkedIn(time)])
+    return self.intervals().namesAtTime(time)
 
   def trainingNames(self):
     return { e.name for e in self.training }
 
+  # the hours that the person spent at the training, once the scans are
+  # fixed up
   def trainingHours(self, personName, eventName):
-    if personName in self.people:
-      return self.people[personName].eventHours(eventName)
-    return 0
+    return self.eventTotals.get(personName, {}).get(eventName, 0)
+
+  # total each person's hours at each training from their day reports
+  def sumTraining(self):
+    self.eventTotals = {}
+    for name in self.people:
+      self.sumPersonTraining(name)
+
+  # one pass over the person's days, adding up each day's hours at the
+  # trainings, rather than going over all of the days for each training
+  def sumPersonTraining(self, name):
+    totals = {}
+    for report in self.people[name].times.values():
+      for (eventName, hours) in report.training.items():
+        totals[eventName] = totals.get(eventName, 0) + hours
+    self.eventTotals[name] = { eventName: hours
+                               for (eventName, hours) in totals.items()
+                               if hours != 0 }
+
+  # total each person's hours, including training, from their day reports
+  def sumHours(self):
+    self.total = {}
+    self.states = {}
+    for name in self.people:
+      self.sumPersonHours(name)
+
+  def sumPersonHours(self, name):
+    self.total[name] = sum([report.hours() + report.trainingHours()
+                            for report in self.people[name].times.values()])
+    self.states[name] = self.getState(self.total[name])
+
+  # the person's total hours in the track, which is 0 if they have none
+  def personTotal(self, name):
+    return self.total.get(name, 0.0)
+
+  # the state of the person's total hours
+  def personState(self, name):
+    state = self.states.get(name)
+    if state is None:
+      state = self.getState(0.0)
+    return state
 
   def getState(self, hours):
     if hours >= self.required_hours:
@@ -235,8 +525,542 @@ class Track:
     else:
       return "warn"
     
+# Decides which track each scan counts for from the rules for each track,
+# which are list((track, first day, last day, set(serial))) with None for
+# no limit. On each day, a scan goes to the first track that lists its
+# scanner or else to the first track that takes every scanner. The rules
+# are compiled into a table with an entry for each day of the season, so
+# a scan takes one list lookup and one dict lookup. Days with the same
+# tracks share an entry.
+class TrackTable:
+  def __init__(self, rules, start, end):
+    self.first = start.toordinal()
+    # list((map(serial, track), track for any other serial or None))
+    self.days = []
+    # map(tuple(rule number), entry)
+    entries = {}
+    day = start
+    while day <= end:
+      key = tuple([i for (i, (track, first, last, serials)) in enumerate(rules)
+                     if (first is None or first <= day) and
+                        (last is None or day <= last)])
+      entry = entries.get(key)
+      if entry is None:
+        entry = entries[key] = self.compileDay([rules[i] for i in key])
+      self.days.append(entry)
+      day += datetime.timedelta(1)
+
+  def compileDay(self, rules):
+    serialTracks = {}
+    anyTrack = None
+    for (track, first, last, serials) in rules:
+      if serials is None:
+        if anyTrack is None:
+          anyTrack = track
+      else:
+        for serial in serials:
+          serialTracks.setdefault(serial, track)
+    return (serialTracks, anyTrack)
+
+  # the track for a scan or None if it isn't in any of them
+  def lookup(self, day, serial):
+    i = day.toordinal() - self.first
+    if i < 0 or i >= len(self.days):
+      return None
+    (serialTracks, anyTrack) = self.days[i]
+    return serialTracks.get(serial, anyTrack)
+
+  # the tracks that scans on the day can count for
+  def tracksOn(self, day):
+    i = day.toordinal() - self.first
+    if i < 0 or i >= len(self.days):
+      return set()
+    (serialTracks, anyTrack) = self.days[i]
+    return set(serialTracks.values()) | set([anyTrack]) - set([None])
+
+# An index of the check in/check out pairs of the fixed up scans in some
+# tracks, for finding who was checked in at a time or during a range. A
+# pair covers [check in, check out). The pairs are sorted by check in and
+# no pair is longer than the longest one, so a query uses bisect to find
+# the few pairs that checked in close enough to the range to overlap it.
+class IntervalIndex:
+  def __init__(self, tracks):
+    # list((check in, check out, track name, name))
+    self.pairs = []
+    for track in tracks:
+      for (name, person) in track.people.items():
+        for report in person.times.values():
+          if report.state != "manual":
+            for i in range(0, len(report.scans) - 1, 2):
+              self.pairs.append((report.scans[i], report.scans[i+1],
+                                 track.name, name))
+    self.pairs.sort()
+    self.starts = [pair[0] for pair in self.pairs]
+    self.longest = max([checkOut - checkIn
+                        for (checkIn, checkOut, _, _) in self.pairs],
+                       default=datetime.timedelta(0))
+
+  # The pairs that checked in no later than stop and checked out after
+  # start. If inclusive is False, the pairs that checked in at stop are
+  # left out.
+  def overlapping(self, start, stop, track=None, inclusive=True):
+    first = bisect.bisect_right(self.starts, start - self.longest)
+    if inclusive:
+      last = bisect.bisect_right(self.starts, stop)
+    else:
+      last = bisect.bisect_left(self.starts, stop)
+    return [pair for pair in self.pairs[first:last]
+                 if pair[1] > start and (track is None or pair[2] == track)]
+
+  # the names that were checked in at the given time
+  def namesAtTime(self, time, track=None):
+    return sorted(set([pair[3] for pair in self.overlapping(time, time,
+                                                             track)]))
+
+  # the names that were checked in at any time from start to stop
+  def namesBetween(self, start, stop, track=None):
+    return sorted(set([pair[3] for pair in self.overlapping(start, stop,
+                                                             track)]))
+
+  # the names that were checked in for part of an Event
+  def namesAtEvent(self, event, track=None):
+    return sorted(set([pair[3] for pair in
+                       self.overlapping(event.start, event.stop, track,
+                                        inclusive=False)]))
+
+# The parsed scans from a single scanner file
+class ScanBatch:
+  def __init__(self, filename):
+    self.filename = filename
+    # list((name, serial, timestamp, day)) in file order
+    self.scans = []
+    # list((line number, message)) for the rows that couldn't be parsed
+    self.errors = []
+    # the number of comment and blank rows
+    self.comments = 0
+    # the number of rows left out because they weren't on the days asked for
+    self.skipped = 0
+    # the number of rows at the start of the file that were left out since
+    # they are all of the rows of duplicateOf, an earlier dump from the
+    # same scanner (see overlappingDumps)
+    self.duplicates = 0
+    self.duplicateOf = None
+    # (serial, hashes) from fingerprintScannerFile, once it is worked out
+    self.fingerprint = None
+
+# find all of the scanner files under the data root, which can be an
+# archive (see archives.py)
+def findScannerFiles(data_root):
+  return archives.findFiles(data_root, '*.TXT')
+
+# Parse a scanner file into a ScanBatch. This doesn't depend on the season,
+# so that the files can be parsed in worker processes.
+# If days is a set of dates, only the scans that count for those days are
+# kept. The rest are skipped by their date field alone, before their
+# timestamps are built.
+# The first skip rows that aren't comments are left out without being
+# parsed, since they are already in another file.
+def readScannerFile(filename, days=None, skip=0):
+  batch = ScanBatch(filename)
+  batch.scans = list(iterScannerFile(batch, days, skip))
+  return batch
+
+# Generate the scans of the batch's file in file order, counting the bad,
+# comment, skipped and duplicate rows in the batch as they are read (see
+# readScannerFile).
+def iterScannerFile(batch, days=None, skip=0):
+  # share the repeated names and serials, which keeps the batch small
+  # when it is pickled back from a worker
+  strings = {}
+  with archives.openFile(batch.filename, 'rt') as inputfile :
+    reader = csv.reader(inputfile, delimiter=',', quotechar='|')
+    for row in reader:
+      if len(row) > 0 and not row[0].startswith('#'):
+        if batch.duplicates < skip:
+          batch.duplicates += 1
+          continue
+        if len(row) < 4:
+          batch.errors.append((reader.line_num,
+                               "expected name,serial,time,date but got %d "
+                               "fields" % len(row)))
+          continue
+        try:
+          if days is not None:
+            # a scan before 4am counts for the day before its date
+            (_, _, _, date, prevdate) = _scanDate(row[3])
+            if date not in days and prevdate not in days:
+              batch.skipped += 1
+              continue
+          dt, day = parseScan(row[3], row[2])
+        except (IndexError, ValueError) as err:
+          batch.errors.append((reader.line_num, str(err)))
+          continue
+        if days is not None and day not in days:
+          batch.skipped += 1
+          continue
+        yield (strings.setdefault(row[0], row[0]),
+               strings.setdefault(row[1], row[1]), dt, day)
+      else:
+        batch.comments += 1
+
+# Parse the scanner files, using a pool of processes if jobs > 1. The
+# batches are returned in the same order as the files. skips has the
+# number of duplicate rows to skip at the start of each file.
+def readScannerFiles(files, jobs=1, days=None, skips=None):
+  if skips is None:
+    skips = [0] * len(files)
+  if jobs > 1 and len(files) > 1:
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+      return list(pool.map(readScannerFile, files, [days] * len(files),
+                           skips))
+  return [readScannerFile(file, days, skip)
+          for (file, skip) in zip(files, skips)]
+
+# Fingerprint the files, using a pool of processes if jobs > 1.
+def fingerprintScannerFiles(files, jobs=1):
+  if jobs > 1 and len(files) > 1:
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+      return list(pool.map(fingerprintScannerFile, files))
+  return [fingerprintScannerFile(file) for file in files]
+
+# The scanners aren't always cleared between dumps, so a file often
+# starts with every row of the scanner's last dump. A fingerprint of a
+# file is the serial of its first row that isn't a comment and a chained
+# hash of its rows that aren't comments, with 8 bytes for each row that
+# hash it and all of the rows before it. The rows at the start of two
+# files are the same exactly when the hashes of the last of them are the
+# same.
+def fingerprintScannerFile(filename):
+  import hashlib
+  serial = None
+  hashes = bytearray()
+  digest = b''
+  with archives.openFile(filename, 'rt') as inputfile:
+    for row in csv.reader(inputfile, delimiter=',', quotechar='|'):
+      if len(row) > 0 and not row[0].startswith('#'):
+        if serial is None and len(row) > 1:
+          serial = row[1]
+        digest = hashlib.blake2b(digest + ','.join(row).encode('utf-8'),
+                                 digest_size=8).digest()
+        hashes += digest
+  return (serial, bytes(hashes))
+
+# Work out the rows of each file that are already in an earlier dump from
+# the same scanner, from their fingerprints as map(file, fingerprint).
+# The files from each scanner are sorted by their length and each one
+# skips all of the rows of the longest shorter one that it starts with,
+# or all of its own rows if it is a copy of one before it, so each row is
+# only read from one file. Returns map(file, (rows, other file)) for the
+# files with rows to skip.
+def overlappingDumps(fingerprints):
+  # map(serial, list((rows, file)))
+  byScanner = {}
+  for (file, (serial, hashes)) in fingerprints.items():
+    if len(hashes) > 0:
+      byScanner.setdefault(serial, []).append((len(hashes) // 8, file))
+  result = {}
+  for files in byScanner.values():
+    files.sort()
+    for (i, (rows, file)) in enumerate(files):
+      hashes = fingerprints[file][1]
+      for (otherRows, other) in files[:i]:
+        end = otherRows * 8
+        if hashes[end - 8:end] == fingerprints[other][1][end - 8:end]:
+          result[file] = (otherRows, other)
+  return result
+
+# Merge the scans of the files in to one stream of (ScanBatch, scan) in
+# the order of the days that they count for and then their time, like
+# sort-times does for the raw rows. batches has an empty ScanBatch for
+# each file, which gets the file's bad, comment and skipped rows but not
+# its scans. Each file is only opened once the stream gets to its first
+# day and is closed when it has been read, so only the files that were
+# being written around the current day are open. Each file only needs to
+# be in day order; a scan for an earlier day than the one before it in
+# its file comes out late and it is up to the caller to notice. skips has
+# the number of duplicate rows to skip at the start of each file.
+def streamScanFiles(batches, days=None, skips=None):
+  import heapq
+  # list((day, timestamp, file number, scan, scans)) with None for the
+  # scan and scans of the files that haven't been opened yet
+  if skips is None:
+    skips = [0] * len(batches)
+  heap = []
+  for (number, batch) in enumerate(batches):
+    peek = ScanBatch(batch.filename)
+    scans = iterScannerFile(peek, days, skips[number])
+    first = next(scans, None)
+    scans.close()
+    if first is not None:
+      heap.append((first[3], first[2], number, None, None))
+    else:
+      (batch.errors, batch.comments, batch.skipped, batch.duplicates) = \
+        (peek.errors, peek.comments, peek.skipped, peek.duplicates)
+  heapq.heapify(heap)
+  while len(heap) > 0:
+    (day, dt, number, scan, scans) = heap[0]
+    if scans is None:
+      scans = iterScannerFile(batches[number], days, skips[number])
+    else:
+      yield (batches[number], scan)
+    scan = next(scans, None)
+    if scan is None:
+      heapq.heappop(heap)
+    else:
+      heapq.heapreplace(heap, (scan[3], scan[2], number, scan, scans))
+
+# print the bad rows of the batch and the rows that it skipped since they
+# are in another dump
+def printSkippedRows(batch):
+  for (line, msg) in batch.errors:
+    print("Warning: Skipping bad row at %s:%d: %s" %
+          (batch.filename, line, msg))
+  if batch.duplicates > 0:
+    print("Skipping %d rows of %s that are in %s" %
+          (batch.duplicates, batch.filename, batch.duplicateOf))
+
+# Read a manual updates file (see Timecards.readOverrides), returning an
+# empty map if there is no file.
+def readOverrideFile(filename):
+  if archives.isFile(filename):
+    import yaml
+    with archives.openFile(filename, "r") as inputfile:
+      return yaml.safe_load(inputfile) or {}
+  return {}
+
+# bump this when the layout of the scan cache changes
+SCAN_CACHE_VERSION = 4
+
+# An on-disk cache of the parsed scanner files, so that the old dumps
+# don't need to be parsed again on every run. Each file is keyed by its
+# path relative to the data root, its size, its mtime and a hash of its
+# contents. A file whose size and mtime still match is taken from the
+# cache; otherwise the hash decides. The cache also keeps each file's
+# fingerprint and the number of duplicate rows that it was parsed
+# without, so it is parsed again if that changes. Runs that only read
+# some of the days store just the fingerprints of the files, with None
+# for the scans.
+class ScanCache:
+  def __init__(self, filename, data_root):
+    self.filename = filename
+    self.data_root = data_root
+    # map(path, (size, mtime, digest, strings, names, serials, times,
+    #            errors, comments, duplicates, fingerprint))
+    self.files = {}
+    self.changed = False
+    if os.path.isfile(filename):
+      try:
+        with open(filename, 'rb') as cachefile:
+          contents = pickle.load(cachefile)
+        if contents.get('version') == SCAN_CACHE_VERSION:
+          self.files = contents['files']
+      except Exception as err:
+        print("Warning: Ignoring unreadable scan cache", filename, err)
+
+  def path(self, file):
+    return os.path.relpath(file, self.data_root)
+
+  # the entry for the file or None if it isn't cached or has changed
+  def entry(self, file):
+    entry = self.files.get(self.path(file))
+    if entry is None:
+      return None
+    stat = archives.stat(file)
+    if entry[0] != stat.st_size:
+      return None
+    if entry[1] != stat.st_mtime_ns:
+      if entry[2] != fileDigest(file):
+        return None
+      entry = (entry[0], stat.st_mtime_ns) + entry[2:]
+      self.files[self.path(file)] = entry
+      self.changed = True
+    return entry
+
+  # Returns the cached ScanBatch for the file or None if it isn't cached,
+  # has changed or was parsed with a different number of duplicate rows
+  # to skip. If days is a set of dates, only the scans for those days are
+  # decoded.
+  def get(self, file, days=None, skip=0):
+    entry = self.entry(file)
+    if entry is None or entry[3] is None or entry[9] != skip:
+      return None
+    return decodeScanBatch(file, entry, days)
+
+  # the cached fingerprint of the file or None
+  def fingerprint(self, file):
+    entry = self.entry(file)
+    return entry[10] if entry is not None else None
+
+  def put(self, batch):
+    stat = archives.stat(batch.filename)
+    self.files[self.path(batch.filename)] = \
+      (stat.st_size, stat.st_mtime_ns, fileDigest(batch.filename)) + \
+      encodeScanBatch(batch) + (batch.duplicates, batch.fingerprint)
+    self.changed = True
+
+  # Remember the file's fingerprint without its scans, unless it already
+  # has an entry.
+  def putFingerprint(self, file, fingerprint):
+    if self.entry(file) is not None:
+      return
+    stat = archives.stat(file)
+    self.files[self.path(file)] = \
+      (stat.st_size, stat.st_mtime_ns, fileDigest(file)) + (None,) * 7 + \
+      (fingerprint,)
+    self.changed = True
+
+  # forget the files that are no longer under the data root
+  def prune(self, files):
+    keep = { self.path(file) for file in files }
+    for path in list(self.files):
+      if path not in keep:
+        del self.files[path]
+        self.changed = True
+
+  def save(self):
+    if not self.changed:
+      return
+    tmp = self.filename + '.tmp'
+    try:
+      with open(tmp, 'wb') as cachefile:
+        pickle.dump({'version': SCAN_CACHE_VERSION, 'files': self.files},
+                    cachefile, pickle.HIGHEST_PROTOCOL)
+      os.replace(tmp, self.filename)
+      self.changed = False
+    except OSError as err:
+      print("Warning: Can't write scan cache", self.filename, err)
+
+def fileDigest(filename):
+  import hashlib
+  digest = hashlib.sha1()
+  with archives.openFile(filename, 'rb') as inputfile:
+    for block in iter(lambda: inputfile.read(1 << 20), b''):
+      digest.update(block)
+  return digest.digest()
+
+# Store a batch as a table of the distinct names and serials and
+# arrays of indexes into it, with each timestamp as seconds since
+# 0001-01-01.
+def encodeScanBatch(batch):
+  strings = {}
+  names = array.array('I')
+  serials = array.array('I')
+  times = array.array('q')
+  for (name, serial, dt, day) in batch.scans:
+    names.append(strings.setdefault(name, len(strings)))
+    serials.append(strings.setdefault(serial, len(strings)))
+    times.append(dt.toordinal() * 86400 + dt.hour * 3600 + dt.minute * 60 +
+                 dt.second)
+  return (list(strings), names.tobytes(), serials.tobytes(), times.tobytes(),
+          list(batch.errors), batch.comments)
+
+def decodeScanBatch(filename, entry, days=None):
+  (strings, nameBytes, serialBytes, timeBytes, errors, comments,
+   duplicates, fingerprint) = entry[3:]
+  names = array.array('I', nameBytes)
+  serials = array.array('I', serialBytes)
+  times = array.array('q', timeBytes)
+  batch = ScanBatch(filename)
+  batch.errors = list(errors)
+  batch.comments = comments
+  batch.duplicates = duplicates
+  batch.fingerprint = fingerprint
+  # map(day ordinal, (year, month, day, date, previous date))
+  dates = {}
+  for i in range(len(times)):
+    (ordinal, seconds) = divmod(times[i], 86400)
+    parsed = dates.get(ordinal)
+    if parsed is None:
+      d = datetime.date.fromordinal(ordinal)
+      parsed = dates[ordinal] = (d.year, d.month, d.day, d,
+                                  d - datetime.timedelta(1))
+    hour = seconds // 3600
+    day = parsed[4] if hour < 4 else parsed[3]
+    if days is not None and day not in days:
+      batch.skipped += 1
+      continue
+    dt = datetime.datetime(parsed[0], parsed[1], parsed[2], hour,
+                           seconds // 60 % 60, seconds % 60)
+    batch.scans.append((strings[names[i]], strings[serials[i]], dt, day))
+  return batch
+
+# the scan cache file from the config, which defaults to <dataRoot>.cache
+def scanCacheFile(config):
+  return config.get('scanCache',
+                    os.path.normpath(config['dataRoot']) + '.cache')
+
+# Read the ScanBatches for all of the scanner files under the data root in
+# file order. If there is a scan cache, only the new or changed files are
+# parsed. If days is a set of dates, only the scans for those days are
+# read and the files that are parsed only have their fingerprints added
+# to the cache, since their scans are incomplete. The rows at the start of
+# a file that are in an earlier dump from the same scanner are skipped
+# (see overlappingDumps).
+def readDataRoot(data_root, jobs=1, scan_cache=False,
+                 profile=profiling.NO_PROFILE, days=None):
+  with profile.phase('discover files'):
+    files = findScannerFiles(data_root)
+  with profile.phase('read scan cache'):
+    cache = None
+    if scan_cache:
+      cache = ScanCache(scan_cache, data_root)
+      cache.prune(files)
+    fingerprints = { file: cache.fingerprint(file) if cache else None
+                     for file in files }
+  with profile.phase('fingerprint files'):
+    new = [file for file in files if fingerprints[file] is None]
+    fingerprints.update(zip(new, fingerprintScannerFiles(new, jobs)))
+    overlaps = overlappingDumps(fingerprints)
+  skips = { file: overlaps.get(file, (0, None))[0] for file in files }
+  with profile.phase('read scan cache'):
+    batches = [cache.get(file, days, skips[file]) if cache else None
+               for file in files]
+  missing = [file for (file, batch) in zip(files, batches) if batch is None]
+  profile.count('files', len(files))
+  profile.count('files fingerprinted', len(new))
+  profile.count('files parsed', len(missing))
+  with profile.phase('parse files', hot=True):
+    parsed = readScannerFiles(missing, jobs, days,
+                              [skips[file] for file in missing])
+    for batch in parsed:
+      batch.fingerprint = fingerprints[batch.filename]
+  with profile.phase('write scan cache'):
+    if cache:
+      if days is None:
+        for batch in parsed:
+          cache.put(batch)
+      else:
+        for file in new:
+          cache.putFingerprint(file, fingerprints[file])
+      cache.save()
+  # keep the batches in file order, so the tracks come out the same no
+  # matter where each batch came from
+  parsed.reverse()
+  batches = [batch if batch is not None else parsed.pop()
+             for batch in batches]
+  for batch in batches:
+    batch.duplicateOf = overlaps.get(batch.filename, (0, None))[1]
+  return batches
+
 class Timecards:
-  def __init__(self, config):
+  # The scans and manual updates are read from the dataRoot, unless they
+  # are passed in as a list of ScanBatches and a map in the same form as
+  # manual.yaml.
+  # If a profiling.Profile is given, the phases are timed with it.
+  # A command that only needs some of the data can pass the set of days
+  # and the list of track names it needs. The scans and manual updates
+  # for the other days and tracks are skipped as they are read, so they
+  # are never classified or fixed up.
+  # The split rules are read from <dataRoot>/splits.yaml, unless they are
+  # passed in as from readSplitFile.
+  # With stream: true in the config, the dataRoot is read as one stream
+  # in day order instead (see streamScanners).
+  def __init__(self, config, batches=None, overrides=None,
+               profile=profiling.NO_PROFILE, days=None, trackNames=None,
+               splits=None):
+    self.profile = profile
     self.tracks = {}
     for name, trackConfig in config['tracks'].items():
       self.tracks[name] = Track(name,
@@ -244,10 +1068,13 @@ class Timecards:
                                 trackConfig.get('warn', 0),
                                 trackConfig.get('goal', 0),
                                 trackConfig.get('training', {}))
-    self.preseason_track = self.tracks['Pre-season']
-    self.tech_track = self.tracks['Technical']
-    self.business_track = self.tracks['Business']
-    self.post_bag_track = self.tracks['Post-Bag']
+    # the standard tracks, which are None if they aren't configured
+    self.preseason_track = self.tracks.get('Pre-season')
+    self.tech_track = self.tracks.get('Technical')
+    self.business_track = self.tracks.get('Business')
+    self.post_bag_track = self.tracks.get('Post-Bag')
+    # IntervalIndex over all of the tracks, built when it is first needed
+    self.index = None
     self.warnings = []
     self.start_date = parseDate(config['startDate'])
     self.end_date = parseDate(config['endDate'])
@@ -255,43 +1082,428 @@ class Timecards:
     self.bag_date = parseDate(config['bagDate'])
     self.data_root = config['dataRoot']
     self.mangle_names = config.get('mangleNames', True)
-    self.business_scanner = config['businessScanner']
-    self.readScanners(self.data_root)
-    self.readOverrides(os.path.join(self.data_root, "manual.yaml"))
-    self.fixup()
+    # the names of everyone in the scans and manual updates
+    self.registry = NameRegistry(self.mangle_names)
+    self.business_scanner = config.get('businessScanner')
+    self.track_table = TrackTable(self.trackRules(config), self.start_date,
+                                  self.end_date)
+    # "objects" or "columnar" for the NumPy version of fixup
+    self.backend = config.get('backend', 'objects')
+    # the number of processes to read the scanner files with
+    self.jobs = config.get('jobs', 1)
+    # the file to cache the parsed scanner files in or False for none
+    self.scan_cache = scanCacheFile(config)
+    # read the dataRoot as one stream in day order
+    self.stream = config.get('stream', False)
+    # the Occupancy of a streamed season, which is swept as each day is
+    # finished, or None
+    self.occupancy = None
+    # map(day, list(SplitRule))
+    if splits is None:
+      splits = readSplitFile(os.path.join(self.data_root, "splits.yaml"))
+    self.splits = splits
+    # the tracks to load or None for all of them
+    self.track_names = None
+    if trackNames is not None:
+      self.track_names = self.splitTracks(trackNames)
+    # the days to load or None for all of them
+    self.days = self.scopeDays(days)
+    if batches is None and self.stream:
+      if overrides is None:
+        with profile.phase('read overrides'):
+          overrides = readOverrideFile(os.path.join(self.data_root,
+                                                    "manual.yaml"))
+      self.streamScanners(self.data_root, overrides)
+    else:
+      if batches is None:
+        self.readScanners(self.data_root)
+      else:
+        with profile.phase('classify scans', hot=True):
+          for batch in batches:
+            self.addScans(batch)
+      if overrides is None:
+        self.readOverrides(os.path.join(self.data_root, "manual.yaml"))
+      else:
+        self.applyOverrides(overrides)
+      self.fixup()
+    self.warnings.sort()
+    self.countPostBagDays()
+
+  # The rules for which track each scan counts for (see TrackTable). Each
+  # track can have a "from" and "until" day and a list of "scanners" in
+  # config.yaml. If none of them do, the standard tracks are set up from
+  # kickOff, bagDate and businessScanner, which is then required.
+  def trackRules(self, config):
+    rules = []
+    if any([key in (trackConfig or {})
+            for trackConfig in config['tracks'].values()
+            for key in ['from', 'until', 'scanners']]):
+      for (name, trackConfig) in config['tracks'].items():
+        trackConfig = trackConfig or {}
+        first = trackConfig.get('from')
+        last = trackConfig.get('until')
+        serials = trackConfig.get('scanners')
+        rules.append((self.tracks[name],
+                      parseDate(first) if first is not None else None,
+                      parseDate(last) if last is not None else None,
+                      set([str(serial) for serial in serials])
+                        if serials is not None else None))
+    else:
+      if self.business_track is not None and self.business_scanner is None:
+        raise ValueError("The Business track needs a businessScanner in "
+                         "config.yaml")
+      day = datetime.timedelta(1)
+      standard = [(self.preseason_track, None, self.kick_date - day, None),
+                  (self.business_track, self.kick_date, self.bag_date,
+                   set([str(self.business_scanner)])),
+                  (self.tech_track, self.kick_date, self.bag_date, None),
+                  (self.post_bag_track, self.bag_date + day, None, None)]
+      rules = [rule for rule in standard if rule[0] is not None]
+    return rules
+
+  # the tracks along with the ones that split rules move time to or from
+  # them, since their hours depend on each other
+  def splitTracks(self, trackNames):
+    result = set(trackNames)
+    rules = [rule for rules in self.splits.values() for rule in rules]
+    grown = True
+    while grown:
+      grown = False
+      for rule in rules:
+        if (rule.source in result) != (rule.target in result):
+          result |= set([rule.source, rule.target])
+          grown = True
+    return result
+
+  # the set of days that the days and tracks asked for cover or None for
+  # the whole season
+  def scopeDays(self, days):
+    if self.track_names is not None:
+      tracked = set()
+      day = self.start_date
+      while day <= self.end_date:
+        if any([track.name in self.track_names
+                for track in self.track_table.tracksOn(day)]):
+          tracked.add(day)
+        day += datetime.timedelta(1)
+      days = tracked if days is None else tracked.intersection(days)
+    return frozenset(days) if days is not None else None
+
+  def readScanners(self, data_root):
+    batches = readDataRoot(data_root, self.jobs, self.scan_cache, self.profile,
+                           self.days)
+    with self.profile.phase('classify scans', hot=True):
+      for batch in batches:
+        self.addScans(batch)
+
+  # add the scans from one file to the tracks
+  def addScans(self, batch):
+    print ('Reading file', batch.filename)
+    printSkippedRows(batch)
+    (outside, skipped) = self.classifyScans(batch.scans)
+    self.countRows(batch, len(batch.scans), outside, skipped)
+
+  # count the rows of a file, of which rows were scans and outside and
+  # skipped were the scans outside of the season and outside of the scope
+  def countRows(self, batch, rows, outside, skipped):
+    self.profile.count('rows read', rows + len(batch.errors) + batch.skipped +
+                       batch.duplicates)
+    self.profile.count('comment rows', batch.comments)
+    self.profile.count('bad rows', len(batch.errors))
+    self.profile.count('duplicate rows', batch.duplicates)
+    self.profile.count('rows outside season', outside)
+    self.profile.count('rows outside scope', skipped + batch.skipped)
+
+  # Add the scans to the tracks, returning the number of them outside of
+  # the season and outside of the scope. If keys is a dict, each
+  # (track, name) that a scan is added for is put in it.
+  def classifyScans(self, scans, keys=None):
+    outside = 0
+    skipped = 0
+    canonical = self.registry.canonical
+    # TrackTable.lookup without the calls, since this is run for every scan
+    trackDays = self.track_table.days
+    first = self.track_table.first
+    for (rawName, serial, dt, day) in scans:
+      if self.start_date <= day and day <= self.end_date:
+        if self.days is not None and day not in self.days:
+          skipped += 1
+          continue
+        (serialTracks, anyTrack) = trackDays[day.toordinal() - first]
+        track = serialTracks.get(serial, anyTrack)
+        if track is None:
+          outside += 1
+          continue
+        if self.track_names is not None and track.name not in self.track_names:
+          skipped += 1
+          continue
+        name = canonical.get(rawName) or self.registry.name(rawName)
+        person = track.people.setdefault(name, PersonInTrack())
+        person.addDate(day, dt)
+        if keys is not None:
+          keys[(track, name)] = None
+        if day not in track.dates :
+          track.dates.append(day)
+      else:
+        outside += 1
+    return (outside, skipped)
+
+  # Read the scanner files as one stream in day order (see
+  # streamScanFiles) and finish each day once the stream has passed the
+  # 4am boundary after the next day, so only the scans of a couple of days
+  # are held in memory instead of the whole season's. The extra day lets
+  # a file be a little out of order, such as one with each person's scans
+  # for the night together, even when they stayed past 4am. The scan cache
+  # and the jobs aren't used, since they would hold every file in memory,
+  # and the day reports are always fixed up with the objects backend.
+  def streamScanners(self, data_root, manualUpdates):
+    import occupancy
+    self.occupancy = occupancy.Occupancy(self, [], keepIntervals=False)
+    # map(day, list((track, name, hours))) of the manual updates, which
+    # replace the scans when their day is finished
+    overrides = {}
+    for (track, name, day, hours) in self.overrideEntries(manualUpdates):
+      overrides.setdefault(day, []).append((track, name, hours))
+    files = findScannerFiles(data_root)
+    with self.profile.phase('fingerprint files'):
+      overlaps = overlappingDumps(dict(zip(files,
+                                           fingerprintScannerFiles(files))))
+    batches = [ScanBatch(file) for file in files]
+    for batch in batches:
+      batch.duplicateOf = overlaps.get(batch.filename, (0, None))[1]
+    print ('Streaming', len(batches), 'files')
+    # map(day, list(scan)) of the days that haven't been finished
+    scans = {}
+    # the last day that the stream has got to and the last one finished
+    latest = None
+    finished = None
+    # map(filename, count) of the scans in each file and of the ones for
+    # days that were already finished
+    rows = {}
+    late = {}
+    # the scans outside of the season and outside of the scope
+    counts = [0, 0]
+    with self.profile.phase('stream scans', hot=True):
+      for (batch, scan) in streamScanFiles(
+          batches, self.days, [overlaps.get(batch.filename, (0, None))[0]
+                               for batch in batches]):
+        rows[batch.filename] = rows.get(batch.filename, 0) + 1
+        day = scan[3]
+        if latest is None or day > latest:
+          latest = day
+          finished = day - datetime.timedelta(2)
+          self.finishDays(scans, overrides, latest - datetime.timedelta(1),
+                          counts)
+        elif day <= finished:
+          late[batch.filename] = late.get(batch.filename, 0) + 1
+          continue
+        scans.setdefault(day, []).append(scan)
+      self.finishDays(scans, overrides, None, counts)
+    for batch in batches:
+      printSkippedRows(batch)
+      if batch.filename in late:
+        print("Warning: Skipping %d scans in %s for days that were already "
+              "finished" % (late[batch.filename], batch.filename))
+      self.countRows(batch, rows.get(batch.filename, 0), 0, 0)
+    self.profile.count('rows outside season', counts[0])
+    self.profile.count('rows outside scope', counts[1])
+    self.profile.count('late scans', sum(late.values()))
+    with self.profile.phase('sum tracks'):
+      for track in self.tracks.values():
+        track.dates.sort(reverse=True)
+        track.sumTraining()
+        track.sumHours()
+    for warning in self.warnings:
+      if warning[4].startswith('Odd number of events'):
+        self.profile.count('odd scans resolved')
+
+  # Add the scans of the days before until, or of all of them if it is
+  # None, and finish them along with the days with manual updates. scans
+  # and overrides are map(day, list) of the days left. counts has the
+  # number of scans outside of the season and outside of the scope added
+  # to it.
+  def finishDays(self, scans, overrides, until, counts):
+    for day in sorted([day for day in set(scans) | set(overrides)
+                           if until is None or day < until]):
+      # map((track, name), None) of the people with scans on the day
+      keys = {}
+      (outside, skipped) = self.classifyScans(scans.pop(day, []), keys)
+      counts[0] += outside
+      counts[1] += skipped
+      self.finishDay(day, keys, overrides.pop(day, []))
+
+  # Fix up the day reports of a day that the stream has passed, like
+  # fixupTracks does for the whole season, and replace them with their
+  # DayTotals. keys has the (track, name) of the people with scans on the
+  # day and manual is list((track, name, hours)) of its manual updates.
+  def finishDay(self, day, keys, manual):
+    for (track, name, hours) in manual:
+      self.addOverride(track, name, day, hours)
+      keys[(track, name)] = None
+    week = (day - self.kick_date).days // 7
+    # the training events in the 24 hours from 4am that the day covers
+    start = datetime.datetime.combine(day, datetime.time(4))
+    stop = start + datetime.timedelta(1)
+    trainings = { track: [event for event in track.training
+                                if event.start < stop and event.stop > start]
+                  for track in self.tracks.values() }
+    for (track, name) in keys:
+      report = track.people[name].times[day]
+      report.fixUp(name, day, track.name, trainings[track], self.warnings)
+      self.profile.count('near duplicates dropped', len(report.ignored))
+      track.byWeek[week] = track.byWeek.get(week, 0) + report.hours() + \
+                           report.trainingHours()
+    if day in self.splits:
+      for key in self.applySplits(set([(name, day)
+                                       for (track, name) in keys])):
+        keys[key] = None
+    # list((check in, check out, track name, name)) for the Occupancy
+    pairs = []
+    for (track, name) in keys:
+      person = track.people.get(name)
+      report = person.times.get(day) if person is not None else None
+      if report is not None:
+        if report.state != "manual":
+          for i in range(0, len(report.scans) - 1, 2):
+            pairs.append((report.scans[i], report.scans[i+1], track.name,
+                          name))
+        person.times[day] = DayTotal(report)
+    self.occupancy.sweep(pairs)
+    self.profile.count('days finished')
+
+  # the track that a scan from the scanner on the given day counts for or
+  # None if it doesn't count for any
+  def trackFor(self, day, serial):
+    return self.track_table.lookup(day, serial)
+
+  def personName(self, rawName):
+    return self.registry.name(rawName)
+
+  # Replace the day reports for the given days with ones built from the
+  # raw scans and manual hours (or None), keeping the weekly hours, the
+  # totals, the training totals and the warnings up to date. This lets a
+  # long running process apply new scans without redoing the whole fixup.
+  # changes is a list((track, name, day, list(timestamp), manual hours))
+  # A day with split rules needs changes for every track in its rules,
+  # since the rules are applied again to the new day reports.
+  def updateDays(self, changes):
+    keys = set([(name, day, track.name)
+                for (track, name, day, scans, manual) in changes])
+    self.warnings = [warn for warn in self.warnings
+                          if (warn[1], warn[2], warn[3]) not in keys]
+    # set((track, name)) of the people whose totals need to be redone
+    touched = set()
+    for (track, name, day, scans, manual) in changes:
+      week = (day - self.kick_date).days // 7
+      person = track.people.setdefault(name, PersonInTrack())
+      old = person.times.pop(day, None)
+      if old is not None:
+        track.byWeek[week] -= old.hours() + old.trainingHours()
+      if len(scans) > 0 or manual is not None:
+        report = DayReport()
+        for time in scans:
+          report.append(time)
+        if manual is not None:
+          report.manualUpdate(manual)
+        report.fixUp(name, day, track.name, track.training, self.warnings)
+        person.times[day] = report
+        track.byWeek[week] = track.byWeek.get(week, 0) + report.hours() + \
+                             report.trainingHours()
+        if day not in track.dates:
+          track.dates.append(day)
+          track.dates.sort(reverse=True)
+      elif (day in track.dates and
+            not any([day in other.times for other in track.people.values()])):
+        track.dates.remove(day)
+      touched.add((track, name))
+    touched |= self.applySplits(set([(name, day) for (track, name, day, scans,
+                                                      manual) in changes
+                                                 if day in self.splits]))
+    for (track, name) in touched:
+      person = track.people.get(name)
+      if person is not None and len(person.times) > 0:
+        track.sumPersonTraining(name)
+        track.sumPersonHours(name)
+      else:
+        track.people.pop(name, None)
+        track.eventTotals.pop(name, None)
+        track.total.pop(name, None)
+        track.states.pop(name, None)
+      track.index = None
+    self.index = None
     self.warnings.sort()
-    if len(self.post_bag_track.dates) > 0:
+    self.countPostBagDays()
+
+  # Split the day reports of each (name, day) in keys with the split rules
+  # for the day, keeping the weekly hours and the track dates up to date.
+  # The days that are manually updated in either track are left alone.
+  # Returns set((track, name)) of the people that changed.
+  def applySplits(self, keys):
+    changed = set()
+    for (name, day) in sorted(keys):
+      week = (day - self.kick_date).days // 7
+      for rule in self.splits[day]:
+        source = self.tracks[rule.source]
+        target = self.tracks[rule.target]
+        person = source.people.get(name)
+        report = person.times.get(day) if person is not None else None
+        if report is None or report.state == "manual":
+          continue
+        targetPerson = target.people.get(name)
+        existing = targetPerson.times.get(day) if targetPerson else None
+        if existing is not None and existing.state == "manual":
+          continue
+        before = report.hours() + report.trainingHours()
+        moved = report.splitAt(rule.time)
+        if moved is None:
+          continue
+        self.profile.count('days split')
+        self.warnings.append(('info', name, day, source.name,
+                              "%.2f hours moved to %s at %s" %
+                              (calculateHours(moved.scans), target.name,
+                               rule.time.strftime('%H:%M'))))
+        report.addTrainings(source.training)
+        source.byWeek[week] = source.byWeek[week] - before + \
+                              report.hours() + report.trainingHours()
+        if len(report.scans) == 0:
+          del person.times[day]
+          if len(person.times) == 0:
+            del source.people[name]
+          if not any([day in other.times
+                      for other in source.people.values()]):
+            source.dates.remove(day)
+        if existing is not None:
+          before = existing.hours() + existing.trainingHours()
+          existing.merge(moved)
+          existing.addTrainings(target.training)
+          target.byWeek[week] = target.byWeek[week] - before + \
+                                existing.hours() + existing.trainingHours()
+        else:
+          moved.addTrainings(target.training)
+          target.people.setdefault(name, PersonInTrack()).times[day] = moved
+          target.byWeek[week] = target.byWeek.get(week, 0) + moved.hours() + \
+                                moved.trainingHours()
+          if day not in target.dates:
+            target.dates.append(day)
+            target.dates.sort(reverse=True)
+        changed |= set([(source, name), (target, name)])
+    return changed
+
+  def countPostBagDays(self):
+    if self.post_bag_track is not None and len(self.post_bag_track.dates) > 0:
       self.post_bag_days = (self.post_bag_track.dates[0] - self.bag_date).days
     else:
       self.post_bag_days = 0
 
-  def readScanners(self, data_root):
-    for file in [y for x in os.walk(data_root)
-                   for y in glob.glob(os.path.join(x[0], '*.TXT'))]:
-      print ('Reading file', file)
-      with open(file, 'rt') as inputfile :
-        reader = csv.reader(inputfile, delimiter=',', quotechar='|')
-        for row in reader:
-          if len(row) > 0 and not row[0].startswith('#'):
-            dt = parseDateTime(row[3], row[2])
-            day = adjustDate(dt)
-            if self.start_date <= day and day <= self.end_date:
-              if day < self.kick_date:
-                track = self.preseason_track
-              elif day > self.bag_date:
-                track = self.post_bag_track
-              elif row[1] == self.business_scanner:
-                track = self.business_track
-              else:
-                track = self.tech_track
-              if self.mangle_names:
-                name = mangleName(row[0])
-              else:
-                name = row[0]
-              person = track.people.setdefault(name, PersonInTrack())
-              person.addDate(day, dt)
-              if day not in track.dates :
-                track.dates.append(day)
+  def intervals(self):
+    if self.index is None:
+      self.index = IntervalIndex(self.tracks.values())
+    return self.index
+
+  # are Pre-season, Technical, Business and Post-Bag all configured?
+  def hasStandardTracks(self):
+    return None not in [self.preseason_track, self.tech_track,
+                        self.business_track, self.post_bag_track]
 
   def names(self):
     return sorted(set([name for track in self.tracks.values()
@@ -304,38 +1516,93 @@ class Timecards:
   #     <name>: <hours>
   # For each entry, overrides any checkins on that date
   def readOverrides(self, filename):
-    if os.path.isfile(filename):
-      manualUpdates = yaml.load(open(filename, "r"))
-      for (trackName, dateList) in manualUpdates.items():
-        track = self.tracks[trackName]
-        if dateList:
-          for dateStr in dateList:
-            day = parseDate(dateStr)
-            for (rawName, hours) in dateList[dateStr].items():
-              name = mangleName(rawName)
-              person = track.people.setdefault(name, PersonInTrack())
-              person.manualUpdate(day, hours)
-              if day not in track.dates :
-                track.dates.append(day)
+    with self.profile.phase('read overrides'):
+      manualUpdates = readOverrideFile(filename)
+    self.applyOverrides(manualUpdates)
+
+  def applyOverrides(self, manualUpdates):
+    with self.profile.phase('apply overrides'):
+      for (track, name, day, hours) in self.overrideEntries(manualUpdates):
+        self.addOverride(track, name, day, hours)
+
+  # generate (track, name, day, hours) for each of the manual updates in
+  # the scope
+  def overrideEntries(self, manualUpdates):
+    for (trackName, dateList) in manualUpdates.items():
+      track = self.tracks[trackName]
+      if self.track_names is not None and trackName not in self.track_names:
+        continue
+      if dateList:
+        for dateStr in dateList:
+          day = parseDate(dateStr)
+          if self.days is not None and day not in self.days:
+            continue
+          for (rawName, hours) in dateList[dateStr].items():
+            yield (track, self.registry.name(rawName), day, hours)
+
+  def addOverride(self, track, name, day, hours):
+    person = track.people.setdefault(name, PersonInTrack())
+    person.manualUpdate(day, hours)
+    self.profile.count('overrides')
+    if day not in track.dates :
+      track.dates.append(day)
 
   def fixup(self):
+    with self.profile.phase('fixup', hot=True):
+      self.fixupTracks()
+    if self.profile.enabled:
+      for warning in self.warnings:
+        if warning[4].startswith('Odd number of events'):
+          self.profile.count('odd scans resolved')
+
+  def fixupTracks(self):
     for track in self.tracks.values():
       track.dates.sort(reverse=True)
-      for (name, person) in track.people.items():
-        for (date, report) in person.times.items():
-          report.fixUp(name, date, track.name, track.training, self.warnings)
-          week = (date - self.kick_date).days // 7
-          track.byWeek[week] = track.byWeek.get(week, 0) + report.hours() + \
-                               report.trainingHours()
+    if self.backend == 'columnar':
+      import columnar
+      columnar.ScanColumns(self.tracks, self.registry).fixup(self)
+    else:
+      for track in self.tracks.values():
+        for (name, person) in track.people.items():
+          for (date, report) in person.times.items():
+            report.fixUp(name, date, track.name, (), self.warnings)
+        attributeTraining(track)
+        for person in track.people.values():
+          for (date, report) in person.times.items():
+            week = (date - self.kick_date).days // 7
+            track.byWeek[week] = track.byWeek.get(week, 0) + \
+                                 report.hours() + report.trainingHours()
+    # count them before the splits drop the reports whose time all moved
+    if self.profile.enabled:
+      for track in self.tracks.values():
+        for person in track.people.values():
+          for report in person.times.values():
+            self.profile.count('near duplicates dropped', len(report.ignored))
+    if len(self.splits) > 0:
+      # one pass over the day reports of the tracks that lose time
+      sources = set([rule.source for rules in self.splits.values()
+                                 for rule in rules])
+      self.applySplits(set([(name, day) for trackName in sources
+                            for (name, person) in
+                              self.tracks[trackName].people.items()
+                            for day in person.times if day in self.splits]))
+    for track in self.tracks.values():
+      track.sumTraining()
+      track.sumHours()
 
   def printSummary(self):
     print ("Dates: start:", self.start_date, ", end:", self.end_date,
            ", bag:", self.bag_date)
-    print ("Total of", len(self.names()), 'names with',
-           len(self.preseason_track.dates), 'pre-season,',
-           len(self.tech_track.dates), 'technical,',
-           len(self.business_track.dates), 'business, and',
-           self.post_bag_days, 'post-bag days')
+    if self.hasStandardTracks():
+      print ("Total of", len(self.names()), 'names with',
+             len(self.preseason_track.dates), 'pre-season,',
+             len(self.tech_track.dates), 'technical,',
+             len(self.business_track.dates), 'business, and',
+             self.post_bag_days, 'post-bag days')
+    else:
+      print ("Total of", len(self.names()), 'names with',
+             ', '.join(['%d %s' % (len(track.dates), track.name)
+                        for track in self.tracks.values()]), 'days')
     summary = {}
     for warn in self.warnings:
       kind = warn[0]
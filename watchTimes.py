@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+# Time card applicaiton for FRC Team 1868
+
+# Keeps the Timecards up to date during build season. It watches the
+# dataRoot for new or changed scanner files and manual.yaml for changed
+# overrides, and only redoes the day reports that they touch. The current
+# numbers are served as JSON on localhost:
+#   /totals                           - each name's hours in each track
+#   /weeks                            - each track's hours per week
+#   /warnings                         - the warnings
+#   /names?time=01/07/2017+14:30:00   - who was checked in, with an
+#                                       optional &track=Technical
+#   /snapshot                         - writes the xlsx workbook
+#
+# ./watchTimes.py --port 8068
+
+import archives
+import argparse
+import http.server
+import json
+import os.path
+import report
+import scanners
+import threading
+import time
+import urllib.parse
+import yaml
+
+class Watcher:
+  def __init__(self, config, jobs):
+    self.config = config
+    self.data_root = config['dataRoot']
+    self.manual_file = os.path.join(self.data_root, "manual.yaml")
+    self.splits_file = os.path.join(self.data_root, "splits.yaml")
+    self.lock = threading.Lock()
+    # set when an update fails part way through, so the next poll reads
+    # everything again
+    self.stale = False
+    # map(path, (size, mtime))
+    self.files = {}
+    # map(path, fingerprint) and map(path, rows skipped) for the rows that
+    # are in an earlier dump from the same scanner
+    self.fingerprints = {}
+    self.skips = {}
+    # map(path, list((track, name, day, timestamp)))
+    self.fileScans = {}
+    # map((track, name, day), list(timestamp)) of the scans before fixup
+    self.scans = {}
+    # map((track, name, day), hours)
+    self.overrides = {}
+    self.manual_mtime = None
+    self.splits_mtime = None
+
+    batches = scanners.readDataRoot(self.data_root, jobs,
+                                    scanners.scanCacheFile(config))
+    overrides = scanners.readOverrideFile(self.manual_file)
+    self.timecards = scanners.Timecards(config, batches, overrides)
+    for batch in batches:
+      self.fingerprints[batch.filename] = batch.fingerprint
+      self.addFile(batch)
+    self.overrides = self.flattenOverrides(overrides)
+    self.manual_mtime = self.mtime(self.manual_file)
+    self.splits_mtime = self.mtime(self.splits_file)
+
+  def mtime(self, filename):
+    if archives.isFile(filename):
+      return archives.stat(filename).st_mtime_ns
+    return None
+
+  # remember the raw scans from a batch, returning the days they touch
+  def addFile(self, batch):
+    stat = archives.stat(batch.filename)
+    self.files[batch.filename] = (stat.st_size, stat.st_mtime_ns)
+    self.skips[batch.filename] = batch.duplicates
+    timecards = self.timecards
+    scans = []
+    for (rawName, serial, dt, day) in batch.scans:
+      track = timecards.trackFor(day, serial)
+      if (timecards.start_date <= day and day <= timecards.end_date and
+          track is not None):
+        key = (track, timecards.personName(rawName), day)
+        self.scans.setdefault(key, []).append(dt)
+        scans.append(key + (dt,))
+    self.fileScans[batch.filename] = scans
+    return set([scan[:3] for scan in scans])
+
+  # forget the raw scans from a file, returning the days they touched
+  def removeFile(self, filename):
+    self.files.pop(filename, None)
+    self.skips.pop(filename, None)
+    keys = set()
+    for (track, name, day, dt) in self.fileScans.pop(filename, []):
+      key = (track, name, day)
+      self.scans[key].remove(dt)
+      keys.add(key)
+    return keys
+
+  def flattenOverrides(self, overrides):
+    result = {}
+    for (trackName, dateList) in overrides.items():
+      for (dateStr, hoursList) in (dateList or {}).items():
+        for (rawName, hours) in hoursList.items():
+          result[(self.timecards.tracks[trackName],
+                  self.timecards.personName(rawName),
+                  scanners.parseDate(dateStr))] = hours
+    return result
+
+  # Look for new, changed or removed scanner files and a changed
+  # manual.yaml or splits.yaml and update the day reports that they touch.
+  # A file is read again when the number of its rows that are in an
+  # earlier dump changes, such as when that dump is removed. Everything is
+  # read before anything is changed, so if a file can't be read the old
+  # numbers are kept and the file is tried again on the next poll.
+  def poll(self):
+    if self.stale:
+      print ('Reading', self.data_root, 'again')
+      fresh = Watcher(self.config, 1)
+      with self.lock:
+        vars(self).update([(key, value) for (key, value) in vars(fresh).items()
+                           if key != 'lock'])
+      return
+    files = scanners.findScannerFiles(self.data_root)
+    changed = []
+    for file in files:
+      stat = archives.stat(file)
+      if self.files.get(file) != (stat.st_size, stat.st_mtime_ns):
+        changed.append(file)
+    removed = set(self.files) - set(files)
+    manual_mtime = self.mtime(self.manual_file)
+    splits_mtime = self.mtime(self.splits_file)
+    if (not changed and not removed and manual_mtime == self.manual_mtime and
+        splits_mtime == self.splits_mtime):
+      return
+    fingerprints = dict(self.fingerprints)
+    for file in removed:
+      fingerprints.pop(file)
+    fingerprints.update(zip(changed, scanners.fingerprintScannerFiles(changed)))
+    overlaps = scanners.overlappingDumps(fingerprints)
+    changed += [file for file in files
+                     if file not in changed and
+                        overlaps.get(file, (0, None))[0] != self.skips[file]]
+    batches = scanners.readScannerFiles(
+      changed, skips=[overlaps.get(file, (0, None))[0] for file in changed])
+    overrides = None
+    if manual_mtime != self.manual_mtime:
+      print ('Reading overrides', self.manual_file)
+      overrides = self.flattenOverrides(
+        scanners.readOverrideFile(self.manual_file))
+    splits = None
+    if splits_mtime != self.splits_mtime:
+      print ('Reading split rules', self.splits_file)
+      splits = scanners.readSplitFile(self.splits_file)
+      for rules in splits.values():
+        for rule in rules:
+          for name in (rule.source, rule.target):
+            if name not in self.timecards.tracks:
+              raise ValueError("Unknown track %s in %s" %
+                               (name, self.splits_file))
+    with self.lock:
+      try:
+        self.update(fingerprints, removed, batches, overlaps, overrides,
+                    manual_mtime, splits, splits_mtime)
+      except Exception:
+        self.stale = True
+        raise
+
+  # Change the day reports for what poll read.
+  def update(self, fingerprints, removed, batches, overlaps, overrides,
+             manual_mtime, splits, splits_mtime):
+    self.fingerprints = fingerprints
+    keys = set()
+    for file in removed:
+      print ('Removed file', file)
+      keys |= self.removeFile(file)
+    for batch in batches:
+      print ('Reading file', batch.filename)
+      if batch.duplicates > 0:
+        print ("Skipping %d rows that are in %s" %
+               (batch.duplicates, overlaps[batch.filename][1]))
+      keys |= self.removeFile(batch.filename)
+      keys |= self.addFile(batch)
+    if overrides is not None:
+      self.manual_mtime = manual_mtime
+      keys |= set([key for key in set(overrides) | set(self.overrides)
+                       if overrides.get(key) != self.overrides.get(key)])
+      self.overrides = overrides
+    timecards = self.timecards
+    oldSplits = timecards.splits
+    if splits is not None:
+      self.splits_mtime = splits_mtime
+      timecards.splits = splits
+      days = set(oldSplits) | set(timecards.splits)
+      keys |= set([key for key in set(self.scans) | set(self.overrides)
+                       if key[2] in days])
+    # every track that the old or new rules for a day move time between
+    # is built again
+    for (track, name, day) in list(keys):
+      for rule in oldSplits.get(day, []) + timecards.splits.get(day, []):
+        keys.add((timecards.tracks[rule.source], name, day))
+        keys.add((timecards.tracks[rule.target], name, day))
+    timecards.updateDays([(track, name, day,
+                                self.scans.get((track, name, day), []),
+                                self.overrides.get((track, name, day)))
+                               for (track, name, day) in keys])
+    print ('Updated', len(keys), 'days')
+
+  def totals(self):
+    result = {}
+    for track in self.timecards.tracks.values():
+      for (name, hours) in track.total.items():
+        result.setdefault(name, {})[track.name] = hours
+    return result
+
+  def weeks(self):
+    return { track.name: track.byWeek
+             for track in self.timecards.tracks.values() }
+
+  def warnings(self):
+    return [{'level': level, 'name': name, 'date': date.isoformat(),
+             'track': track, 'message': msg}
+            for (level, name, date, track, msg) in self.timecards.warnings]
+
+  def namesAtTime(self, when, track):
+    [date, clock] = when.split()
+    return self.timecards.intervals().namesAtTime(
+      scanners.parseDateTime(date, clock), track)
+
+  def snapshot(self):
+    report.writeReport(self.timecards, self.config['output'])
+    return {'output': self.config['output']}
+
+class Handler(http.server.BaseHTTPRequestHandler):
+  def do_GET(self):
+    url = urllib.parse.urlparse(self.path)
+    query = urllib.parse.parse_qs(url.query)
+    watcher = self.server.watcher
+    try:
+      with watcher.lock:
+        if url.path == '/totals':
+          result = watcher.totals()
+        elif url.path == '/weeks':
+          result = watcher.weeks()
+        elif url.path == '/warnings':
+          result = watcher.warnings()
+        elif url.path == '/names':
+          result = watcher.namesAtTime(query['time'][0],
+                                       query.get('track', [None])[0])
+        elif url.path == '/snapshot':
+          result = watcher.snapshot()
+        else:
+          self.send_error(404)
+          return
+    except (KeyError, ValueError) as err:
+      self.send_error(400, str(err))
+      return
+    body = json.dumps(result, sort_keys=True).encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Keep the timecards up to date and serve them over HTTP.')
+  parser.add_argument('--port', type=int, default=8068,
+                      help='the localhost port to serve on')
+  parser.add_argument('--interval', type=float, default=5,
+                      help='seconds between checking for new files')
+  parser.add_argument('--jobs', '-j', type=int, default=1,
+                      help='number of processes for the first read')
+  args = parser.parse_args()
+
+  # read configuration from config.yaml file
+  with open("config.yaml", "r") as inputfile:
+    config = yaml.safe_load(inputfile)
+
+  watcher = Watcher(config, args.jobs)
+  watcher.timecards.printSummary()
+  server = http.server.ThreadingHTTPServer(('localhost', args.port), Handler)
+  server.watcher = watcher
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  print ("Serving on http://localhost:%d/" % args.port)
+  while True:
+    time.sleep(args.interval)
+    try:
+      watcher.poll()
+    except Exception as err:
+      print ("Error: Couldn't update the timecards, trying again in %g "
+             "seconds: %s: %s" % (args.interval, type(err).__name__, err))
+
+if __name__ == '__main__':
+  main()